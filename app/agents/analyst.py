@@ -40,22 +40,7 @@ class AnalystAgent:
         # or we manually handle the history.
         # For simplicity in this async env, we'll let the chat session handle it.
         
-        from google.api_core import exceptions
-        import asyncio
-        
-        retries = 3
-        delay = 2
-        
-        for attempt in range(retries):
-            try:
-                chat = self.model.start_chat(enable_automatic_function_calling=True)
-                response = await chat.send_message_async(prompt)
-                return response.text
-            except exceptions.ResourceExhausted:
-                if attempt == retries - 1:
-                    raise
-                await asyncio.sleep(delay * (2 ** attempt))
-            except Exception as e:
-                # Other errors should propagate but we can log them
-                raise e
-
+        # Rate limiting and ResourceExhausted retries are handled by the shared limiter
+        chat = self.model.start_chat(enable_automatic_function_calling=True)
+        response = await chat.send_message_async(prompt)
+        return response.text
@@ -7,9 +7,7 @@ class ClassifierAgent:
         self.model = get_model("gemini-2.0-flash")
 
     async def classify(self, user_input: str) -> dict:
-        import asyncio
         import re
-        from google.api_core import exceptions
         
         current_year = datetime.now().year
         q_upper = user_input.upper()
@@ -45,16 +43,7 @@ class ClassifierAgent:
 
         """
         
-        retries = 3
-        delay = 2
-        for attempt in range(retries):
-            try:
-                response = await self.model.generate_content_async(prompt, generation_config={"response_mime_type": "application/json"})
-                break
-            except exceptions.ResourceExhausted:
-                if attempt == retries - 1:
-                    raise
-                await asyncio.sleep(delay * (2 ** attempt))
+        response = await self.model.generate_content_async(prompt, generation_config={"response_mime_type": "application/json"})
 
         try:
             data = json.loads(response.text)
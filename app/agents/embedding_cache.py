@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+# In-process LRU capacity (entries). Vectors are kept as float32 arrays (~12KB each at 3072 dims).
+EMBEDDING_CACHE_MAX_ITEMS = int(os.getenv("EMBEDDING_CACHE_MAX_ITEMS", "4096"))
+# Persistent tier; set to an empty string to disable it
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model, task_type, sha256(text)).
+    Lookups go to a bounded in-memory LRU first, then to a SQLite store that survives restarts.
+    The SQLite tier blocks, so async callers go through asyncio.to_thread (one hop per batch).
+    """
+
+    def __init__(self, max_items: int = EMBEDDING_CACHE_MAX_ITEMS, path: str | None = EMBEDDING_CACHE_PATH):
+        self.max_items = max_items
+        self._memory: OrderedDict[tuple[str, str, str], array] = OrderedDict()
+        # Separate locks, so LRU lookups never wait behind a SQLite commit
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    task_type TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, task_type, text_hash)
+                )
+            """)
+            self._conn.commit()
+
+    def _remember(self, key: tuple[str, str, str], vector: array):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, model: str, task_type: str, text: str) -> list[float] | None:
+        return self.get_many(model, task_type, [text])[0]
+
+    def get_many(self, model: str, task_type: str, texts: list[str]) -> list[list[float] | None]:
+        """Looks up many texts at once: LRU first, then one SQLite query for all the LRU misses."""
+        keys = [(model, task_type, text_hash(text)) for text in texts]
+        results: list[list[float] | None] = [None] * len(texts)
+        disk_lookups: dict[str, list[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    results[i] = vector.tolist()
+                else:
+                    disk_lookups.setdefault(key[2], []).append(i)
+
+        found: dict[str, array] = {}
+        if self._conn is not None and disk_lookups:
+            hashes = list(disk_lookups)
+            with self._db_lock:
+                # Stay under SQLite's bound-parameter limit
+                for start in range(0, len(hashes), 500):
+                    part = hashes[start:start + 500]
+                    rows = self._conn.execute(
+                        "SELECT text_hash, vector FROM embeddings WHERE model = ? AND task_type = ? "
+                        f"AND text_hash IN ({', '.join('?' * len(part))})",
+                        (model, task_type, *part)
+                    ).fetchall()
+                    for h, blob in rows:
+                        vector = array("f")
+                        vector.frombytes(blob)
+                        found[h] = vector
+
+        with self._lock:
+            for h, positions in disk_lookups.items():
+                vector = found.get(h)
+                if vector is None:
+                    self.misses += len(positions)
+                    continue
+                self._remember((model, task_type, h), vector)
+                self.disk_hits += len(positions)
+                for i in positions:
+                    results[i] = vector.tolist()
+        return results
+
+    def put(self, model: str, task_type: str, text: str, embedding: list[float]):
+        self.put_many(model, task_type, [(text, embedding)])
+
+    def put_many(self, model: str, task_type: str, items: list[tuple[str, list[float]]]):
+        rows = []
+        with self._lock:
+            for text, embedding in items:
+                key = (model, task_type, text_hash(text))
+                vector = array("f", embedding)
+                self._remember(key, vector)
+                rows.append((*key, vector.tobytes()))
+        if self._conn is not None and rows:
+            with self._db_lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, task_type, text_hash, vector) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "memory_items": len(self._memory),
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+embedding_cache = EmbeddingCache()
@@ -1,104 +1,267 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
+from sqlalchemy import select, cast, func, literal, literal_column, union_all, bindparam, true, BigInteger, Float, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+from pgvector.sqlalchemy import HALFVEC, Vector
 from app.models import Filing
-from app.agents.utils import get_embedding
-import re
+from app.agents.utils import get_embedding, get_embeddings_batch
+from app.services.vector_index import VECTOR_DIMENSIONS, SHORT_VECTOR_DIMENSIONS, search_params_cte
+from app.services.vector_cache import filing_matrix_cache
+from app.services.chunk_features import compute_financial_features
+from typing import NamedTuple
+import os
 import asyncio
 
+# Vector retrieval modes:
+#   "exact"      - full 3072-dim L2 distance, sequential scan (ground truth)
+#   "ann"        - HNSW/IVFFlat over the halfvec cast of the full vector
+#   "matryoshka" - ANN recall on the 768-dim prefix, exact rerank of the top k*M on the full vector
+#   "binary"     - Hamming-distance prefilter on the bit(3072) signature, exact rerank of the top k*M
+#   "memory"     - exact scoring in-process against the cached (ticker, year) matrix (app.services.vector_cache)
+SEARCH_MODES = ("exact", "ann", "matryoshka", "binary", "memory")
+SEARCH_MODE = os.getenv("SEARCH_MODE", "ann")
+# M: candidates recalled per requested result in two-stage modes
+RERANK_FACTOR = int(os.getenv("RERANK_FACTOR", "4"))
+# Reciprocal Rank Fusion constant
+RRF_K = 60
+
+
+class SearchHit(NamedTuple):
+    """Lightweight search result with the same attributes callers read from Filing."""
+    id: int
+    ticker: str
+    year: int
+    chunk_index: int
+    text_content: str
+
 
 class SearchAgent:
     def __init__(self, db: AsyncSession):
         self.db = db
 
     def _financial_boost(self, text_content: str) -> float:
+        """Fallback for rows ingested before boost features were precomputed (see scripts/backfill_financial_features.py)."""
+        return compute_financial_features(text_content)["financial_boost"]
+
+    @staticmethod
+    def _vector_text(embedding: list[float]) -> str:
+        """pgvector text literal, e.g. '[0.1,0.2]'."""
+        return "[" + ",".join(map(str, embedding)) + "]"
+
+    def _vector_stmt(self, query_vector, ticker: str, year: int, n: int,
+                     mode: str = SEARCH_MODE, rerank_factor: int = RERANK_FACTOR):
         """
-        Returns a boost factor for chunks containing financial data.
-        Chunks with $ signs, large numbers, and table-like structures get higher scores.
+        Builds the vector-ranking statement (id, distance) for the given retrieval mode, top n rows.
+        `query_vector` is a SQL expression of type vector(3072) (e.g. a column of the batched
+        queries) or a plain list of floats.
         """
-        boost = 1.0
-        
-        # Count dollar signs (strong indicator of financial data)
-        dollar_count = text_content.count('$')
-        if dollar_count >= 5:
-            boost += 0.5
-        elif dollar_count >= 2:
-            boost += 0.3
-        
-        # Count large numbers (millions/billions patterns)
-        large_numbers = re.findall(r'\d{1,3}(?:,\d{3})+|\d+\.\d+\s*(?:million|billion)?', text_content, re.IGNORECASE)
-        if len(large_numbers) >= 3:
-            boost += 0.4
-        
-        # Boost for income statement keywords and section headers
-        income_keywords = ['net income', 'net sales', 'total revenue', 'operating income', 'gross profit', 'earnings per share', 'diluted']
-        for kw in income_keywords:
-            if kw in text_content.lower():
-                boost += 0.2
-                break
-        
-        # Section header prioritization for higher precision extraction
-        section_headers = ['consolidated statements of operations', 'summary of financial data', 'item 8. financial statements']
-        for header in section_headers:
-            if header in text_content.lower():
-                boost += 0.5
-                break
-        
-        return boost
-
-    async def search(self, query: str, ticker: str, year: int, limit: int = 5) -> list[Filing]:
+        if isinstance(query_vector, list):
+            query_vector = cast(literal(self._vector_text(query_vector)), Vector(VECTOR_DIMENSIONS))
+
+        scope = (Filing.ticker == ticker, Filing.year == year)
+        full_distance = Filing.embedding.l2_distance(query_vector)
+
+        if mode == "exact":
+            distance = full_distance
+        elif mode == "ann":
+            distance = cast(Filing.embedding, HALFVEC(VECTOR_DIMENSIONS)).l2_distance(
+                cast(query_vector, HALFVEC(VECTOR_DIMENSIONS))
+            )
+        elif mode == "matryoshka":
+            # Stage 1: ANN recall on the short vector. Stage 2: rerank only those rows on the full vector.
+            short_query = func.l2_normalize(func.subvector(query_vector, 1, SHORT_VECTOR_DIMENSIONS))
+            candidates = (
+                select(Filing.id)
+                .where(*scope)
+                .order_by(Filing.embedding_short.l2_distance(short_query))
+                .limit(n * rerank_factor)
+            )
+            scope = (Filing.id.in_(candidates),)
+            distance = full_distance
+        elif mode == "binary":
+            # Stage 1: Hamming prefilter on the bit signature (quantized in SQL). Stage 2: exact rerank.
+            candidates = (
+                select(Filing.id)
+                .where(*scope)
+                .order_by(Filing.embedding_bits.hamming_distance(func.binary_quantize(query_vector)))
+                .limit(n * rerank_factor)
+            )
+            scope = (Filing.id.in_(candidates),)
+            distance = full_distance
+        else:
+            raise ValueError(f"Unknown search mode: {mode}")
+
+        return (
+            select(Filing.id, distance.label("distance"))
+            .where(*scope)
+            .order_by(distance)
+            .limit(n)
+        )
+
+    def _keyword_stmt(self, query, ticker: str, year: int, n: int):
+        """Builds the keyword-ranking statement (id, score) using ts_rank over the GIN-indexed search_vector."""
+        ts_query = func.plainto_tsquery(literal_column("'english'"), query)
+        score = func.ts_rank(Filing.search_vector, ts_query)
+        return (
+            select(Filing.id, score.label("score"))
+            .where(Filing.ticker == ticker, Filing.year == year, Filing.search_vector.bool_op("@@")(ts_query))
+            .order_by(score.desc())
+            .limit(n)
+        )
+
+    @staticmethod
+    def _ranked_lateral(queries, stmt, order_column: str, descending: bool = False, name: str = "ranked"):
         """
-        Performs hybrid search (Vector + Keyword) using Reciprocal Rank Fusion (RRF)
-        with financial data boosting.
+        Runs an ordered, limited per-query statement once per batched query (LATERAL) and
+        ranks its rows within each query: (qid, id, 1-based rank).
         """
-        # 1. Vector Search
-        query_embedding = await get_embedding(query)
-        vector_stmt = (
-            select(Filing)
-            .where(Filing.ticker == ticker, Filing.year == year)
-            .order_by(Filing.embedding.l2_distance(query_embedding))
-            .limit(limit * 3)  # Fetch more for re-ranking
+        sub = stmt.lateral(f"{name}_rows")
+        order = sub.c[order_column].desc() if descending else sub.c[order_column]
+        rank = func.row_number().over(partition_by=queries.c.qid, order_by=order)
+        return (
+            select(queries.c.qid, sub.c.id, rank.label("rank"))
+            .select_from(queries.join(sub, true()))
+            .cte(name)
         )
-        vector_results = (await self.db.execute(vector_stmt)).scalars().all()
-
-        # 2. Keyword Search (using ts_rank)
-        keyword_stmt = (
-            select(Filing)
-            .where(
-                Filing.ticker == ticker, 
-                Filing.year == year,
-                text("search_vector @@ plainto_tsquery('english', :query)")
+
+    def _memory_ranked(self, qids: list[int], ids: list[int], ranks: list[int], name: str = "vector_ranked"):
+        """(qid, id, rank) CTE from rankings computed in-process, passed as three array parameters."""
+        ranked = (
+            func.unnest(
+                bindparam(f"{name}_qids", value=qids, type_=ARRAY(BigInteger)),
+                bindparam(f"{name}_ids", value=ids, type_=ARRAY(BigInteger)),
+                bindparam(f"{name}_ranks", value=ranks, type_=ARRAY(BigInteger)),
             )
-            .order_by(text("ts_rank(search_vector, plainto_tsquery('english', :query)) DESC"))
-            .limit(limit * 3)
+            .table_valued("qid", "id", "rank")
+            .render_derived()
+        )
+        return select(ranked.c.qid, ranked.c.id, ranked.c.rank).cte(name)
+
+    def _hybrid_stmt(self, vector_ranked, keyword_ranked):
+        """
+        Fuses two (qid, id, rank) selectables with RRF per query and returns only the columns
+        callers need. The embedding and search_vector columns never leave the database.
+        """
+        ranked = union_all(
+            select(vector_ranked.c.qid, vector_ranked.c.id, vector_ranked.c.rank),
+            select(keyword_ranked.c.qid, keyword_ranked.c.id, keyword_ranked.c.rank),
+        ).subquery("ranked")
+        fused = (
+            select(ranked.c.qid, ranked.c.id, func.sum(1.0 / (RRF_K + cast(ranked.c.rank, Float))).label("rrf"))
+            .group_by(ranked.c.qid, ranked.c.id)
+            .cte("fused")
         )
-        keyword_results = (await self.db.execute(keyword_stmt, {"query": query})).scalars().all()
-
-        # 3. RRF (Reciprocal Rank Fusion) with Financial Boosting
-        k = 60
-        scores = {}
-        
-        def process_results(results, weight=1.0):
-            for rank, item in enumerate(results):
-                if item.id not in scores:
-                    scores[item.id] = {"item": item, "score": 0.0}
-                # Apply financial boost to the RRF score
-                financial_mult = self._financial_boost(item.text_content)
-                scores[item.id]["score"] += weight * (1 / (k + rank + 1)) * financial_mult
-
-        process_results(vector_results)
-        process_results(keyword_results)
-        
-        # Sort by score DESC
-        sorted_items = sorted(scores.values(), key=lambda x: x["score"], reverse=True)
-        
-        # Return top N
-        return [x["item"] for x in sorted_items[:limit]]
-
-    async def search_multi(self, query: str, tickers: list[str], year: int, limit: int = 5) -> dict[str, list[Filing]]:
+        return (
+            select(
+                fused.c.qid, Filing.id, Filing.ticker, Filing.year, Filing.chunk_index, Filing.text_content,
+                fused.c.rrf, Filing.financial_boost
+            )
+            .join(fused, Filing.id == fused.c.id)
+        )
+
+    async def _memory_search(self, query_embeddings: list[list[float]], ticker: str, year: int, n: int) -> list[list[SearchHit]]:
+        """Scores all query vectors against the cached (ticker, year) matrix in one matrix multiply."""
+        slice_ = await filing_matrix_cache.get(self.db, ticker, year)
+        results = []
+        for positions, _ in slice_.top_k(query_embeddings, n):
+            results.append([
+                SearchHit(int(slice_.ids[p]), ticker, year, int(slice_.chunk_indices[p]), slice_.texts[p])
+                for p in positions
+            ])
+        return results
+
+    def _rerank(self, rows, limit: int) -> list[SearchHit]:
+        """Applies the precomputed financial boost to the fused RRF scores and returns the top rows."""
+        def score(row):
+            boost = row.financial_boost
+            if boost is None:
+                boost = self._financial_boost(row.text_content)
+            return row.rrf * boost
+
+        scored = sorted(rows, key=score, reverse=True)
+        return [SearchHit(r.id, r.ticker, r.year, r.chunk_index, r.text_content) for r in scored[:limit]]
+
+    async def search_batch(self, queries: list[str], ticker: str, year: int, limit: int = 5,
+                           mode: str = SEARCH_MODE, ef_search: int | None = None,
+                           probes: int | None = None) -> list[list[SearchHit]]:
+        """
+        Hybrid search for many queries against one (ticker, year) at once.
+        All queries are embedded in one batched call, and retrieval for every query runs in
+        a single statement (queries unnested, rankings computed per query via LATERAL).
+        Returns one result list per query, in order.
+        """
+        if not queries:
+            return []
+
+        candidates = limit * 3  # Fetch more for re-ranking
+        embeddings = await get_embeddings_batch(queries)
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                # Batch partial failure: fall back to the single-query path (raises if it fails too)
+                embeddings[i] = await get_embedding(queries[i])
+
+        # One row per query: (vec, qtext, qid)
+        unnested = (
+            func.unnest(
+                bindparam("query_vectors", value=[self._vector_text(e) for e in embeddings], type_=ARRAY(Text)),
+                bindparam("query_texts", value=queries, type_=ARRAY(Text)),
+            )
+            .table_valued("vec", "qtext", with_ordinality="qid")
+            .render_derived()
+        )
+        batch = select(unnested.c.vec, unnested.c.qtext, unnested.c.qid)
+        if mode in ("ann", "matryoshka", "binary"):
+            # ANN parameters are set inside this statement: the query rows are selected from the
+            # set_config CTE, so they (and the index scans LATERAL-joined to them) come after it
+            batch = batch.select_from(unnested.join(search_params_cte(ef_search, probes), true()))
+        batch = batch.cte("q")
+
+        # 1. Vector ranking (in SQL, or in-process for "memory" mode)
+        if mode == "memory":
+            qids, ids, ranks = [], [], []
+            for qid, hits in enumerate(await self._memory_search(embeddings, ticker, year, candidates), start=1):
+                for rank, hit in enumerate(hits, start=1):
+                    qids.append(qid)
+                    ids.append(hit.id)
+                    ranks.append(rank)
+            vector_ranked = self._memory_ranked(qids, ids, ranks)
+        else:
+            query_vector = cast(batch.c.vec, Vector(VECTOR_DIMENSIONS))
+            vector_stmt = self._vector_stmt(query_vector, ticker, year, candidates, mode=mode)
+            vector_ranked = self._ranked_lateral(batch, vector_stmt, "distance", name="vector_ranked")
+
+        # 2. Keyword ranking (ts_rank)
+        keyword_stmt = self._keyword_stmt(batch.c.qtext, ticker, year, candidates)
+        keyword_ranked = self._ranked_lateral(batch, keyword_stmt, "score", descending=True, name="keyword_ranked")
+
+        # 3. RRF fusion per query in the same statement, financial boost applied to the fused rows
+        rows = (await self.db.execute(self._hybrid_stmt(vector_ranked, keyword_ranked))).all()
+        per_query = [[] for _ in queries]
+        for row in rows:
+            per_query[row.qid - 1].append(row)
+        return [self._rerank(query_rows, limit) for query_rows in per_query]
+
+    async def search(self, query: str, ticker: str, year: int, limit: int = 5,
+                     mode: str = SEARCH_MODE, ef_search: int | None = None,
+                     probes: int | None = None) -> list[SearchHit]:
+        """
+        Performs hybrid search (Vector + Keyword) using Reciprocal Rank Fusion (RRF)
+        with financial data boosting.
+        Both rankings and the fusion run in a single SQL statement that returns only
+        id, ticker, year, chunk_index and text.
+        `mode` selects the vector retrieval strategy (see SEARCH_MODES); ef_search / probes
+        tune the ANN index for this query (see app.services.vector_index).
+        """
+        results = await self.search_batch([query], ticker, year, limit, mode=mode, ef_search=ef_search, probes=probes)
+        return results[0]
+
+    async def search_multi(self, query: str, tickers: list[str], year: int, limit: int = 5) -> dict[str, list[SearchHit]]:
         """
         Performs parallel search for multiple tickers using asyncio.gather.
-        Useful for comparison queries.
+        Useful for comparison queries. Each ticker runs on its own pooled session,
+        since this agent's session can't be used concurrently.
         """
-        tasks = [self.search(query, ticker, year, limit) for ticker in tickers]
+        from app.services.search_executor import SearchExecutor
+        executor = SearchExecutor()
+        tasks = [executor.search(query, ticker, year, limit=limit) for ticker in tickers]
         results = await asyncio.gather(*tasks)
         return dict(zip(tickers, results))
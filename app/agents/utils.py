@@ -1,5 +1,13 @@
 import os
 import asyncio
+import contextlib
+import contextvars
+import functools
+import heapq
+import itertools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from google.api_core import exceptions
 from google.generativeai.types import RequestOptions
@@ -7,6 +15,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from app.agents.embedding_cache import embedding_cache
+
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY not found in environment variables")
@@ -16,47 +26,314 @@ genai.configure(api_key=GEMINI_API_KEY)
 # Extended timeout for complex comparison queries (5 minutes)
 REQUEST_TIMEOUT = 300  # seconds
 
+# Process-wide adaptive rate limiting for every Gemini call (generation and embedding).
+# Each model gets a requests/min and a tokens/min token bucket. The allowed rate climbs
+# additively toward the configured quota on success and is halved on ResourceExhausted (AIMD),
+# so we run close to whatever quota the key actually has instead of behind fixed sleeps.
+# Quotas per model: "model=rpm:tpm,...", e.g. "gemini-2.0-flash=2000:4000000".
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+DEFAULT_GENERATION_RPM = int(os.getenv("GENERATION_RPM", "60"))
+DEFAULT_GENERATION_TPM = int(os.getenv("GENERATION_TPM", "1000000"))
+# Embedding RPM counts each content of a batch request
+DEFAULT_EMBEDDING_RPM = int(os.getenv("EMBEDDING_RPM", "1500"))
+DEFAULT_EMBEDDING_TPM = int(os.getenv("EMBEDDING_TPM", "1000000"))
+RATE_LIMIT_START = float(os.getenv("RATE_LIMIT_START", "0.5"))        # initial fraction of quota
+RATE_LIMIT_INCREASE = float(os.getenv("RATE_LIMIT_INCREASE", "0.02"))  # added per successful call
+RATE_LIMIT_FLOOR = float(os.getenv("RATE_LIMIT_FLOOR", "0.02"))        # lowest fraction after cuts
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "5"))  # bucket depth
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "6"))
+
+# Priority classes sharing the quota, most urgent first. Waiting calls are admitted in class
+# order, and each class may only draw a bucket down to its reserve (fraction of bucket depth),
+# so background work backs off before interactive requests ever have to wait on it.
+INTERACTIVE = 0
+PRIORITY_INGEST = 1
+BACKGROUND_INGEST = 2
+BULK = 3
+PRIORITY_CLASSES = {
+    INTERACTIVE: "interactive",
+    PRIORITY_INGEST: "priority_ingest",
+    BACKGROUND_INGEST: "background_ingest",
+    BULK: "bulk",
+}
+PRIORITY_RESERVES = {
+    INTERACTIVE: 0.0,
+    PRIORITY_INGEST: float(os.getenv("PRIORITY_INGEST_RESERVE", "0.2")),
+    BACKGROUND_INGEST: float(os.getenv("BACKGROUND_INGEST_RESERVE", "0.4")),
+    BULK: float(os.getenv("BULK_RESERVE", "0.6")),
+}
+
+_call_priority: contextvars.ContextVar[int] = contextvars.ContextVar("call_priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def call_priority(priority: int):
+    """
+    Runs the enclosed Gemini calls (and tasks created inside) at `priority`. Only ever demotes:
+    priority ingestion started from a bulk run stays bulk.
+    """
+    token = _call_priority.set(max(priority, _call_priority.get()))
+    try:
+        yield
+    finally:
+        _call_priority.reset(token)
+
+
+def estimate_tokens(content) -> int:
+    """Rough prompt size (~4 chars per token); actual usage is settled after the call when known."""
+    if isinstance(content, str):
+        return max(1, len(content) // 4)
+    if isinstance(content, (list, tuple)):
+        return sum(estimate_tokens(c) for c in content) or 1
+    return 1
+
+
+class TokenBucket:
+    """Continuous-refill token bucket. The level may go negative when a call used more than it reserved."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        return max(1.0, self.rate * RATE_LIMIT_BURST_SECONDS)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """
+        Seconds until `amount` can be taken while leaving `reserve` (a fraction of capacity)
+        in the bucket; 0 if it can now. Oversized requests wait for a full bucket.
+        """
+        self._refill()
+        floor = self.capacity * reserve
+        needed = floor + min(amount, self.capacity - floor)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def set_rate(self, per_minute: float):
+        self._refill()
+        self.rate = per_minute / 60.0
+        self.level = min(self.level, self.capacity)
+
+
+class AdaptiveRateLimiter:
+    """Requests/min and tokens/min buckets for one model, with AIMD control of their rates."""
+
+    def __init__(self, model: str, rpm: int, tpm: int):
+        self.model = model
+        self.max_rpm = rpm
+        self.max_tpm = tpm
+        self.fraction = RATE_LIMIT_START
+        self.requests = TokenBucket(rpm * self.fraction)
+        self.tokens = TokenBucket(tpm * self.fraction)
+        # Bumped on every cut; throttles reported by calls admitted before the latest cut
+        # belong to the same overload and don't cut again
+        self.epoch = 0
+        # Waiting calls as a heap of (priority, arrival); only the head may take from the buckets
+        self._waiters: list[tuple[int, int]] = []
+        self._arrivals = itertools.count()
+        self._changed = asyncio.Condition()
+        self.waiting = {priority: 0 for priority in PRIORITY_CLASSES}
+        self.calls = 0
+        self.throttles = 0
+        # Cumulative quota drawn (requests, estimated + settled tokens), for throughput reporting
+        self.requests_used = 0
+        self.tokens_used = 0
+
+    def _apply(self):
+        self.requests.set_rate(self.max_rpm * self.fraction)
+        self.tokens.set_rate(self.max_tpm * self.fraction)
+
+    async def acquire(self, requests: int = 1, tokens: int = 1, priority: int | None = None) -> int:
+        """
+        Waits until the call is the most urgent one waiting and fits in both buckets above its
+        class's reserve. Returns the epoch to report outcomes against.
+        """
+        if priority is None:
+            priority = _call_priority.get()
+        reserve = PRIORITY_RESERVES[priority]
+        entry = (priority, next(self._arrivals))
+        async with self._changed:
+            heapq.heappush(self._waiters, entry)
+            self.waiting[priority] += 1
+            # A more urgent arrival displaces the head, which must stop waiting for tokens
+            self._changed.notify_all()
+            try:
+                while True:
+                    wait = None
+                    if self._waiters[0] == entry:
+                        wait = max(self.requests.wait_time(requests, reserve), self.tokens.wait_time(tokens, reserve))
+                        if wait <= 0:
+                            break
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                self.requests.take(requests)
+                self.tokens.take(tokens)
+                self.calls += 1
+                self.requests_used += requests
+                self.tokens_used += tokens
+                return self.epoch
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self.waiting[priority] -= 1
+                self._changed.notify_all()
+
+    def on_success(self, reserved_tokens: int = 0, used_tokens: int | None = None):
+        if used_tokens is not None and used_tokens > reserved_tokens:
+            self.tokens.take(used_tokens - reserved_tokens)
+            self.tokens_used += used_tokens - reserved_tokens
+        if self.fraction < 1.0:
+            self.fraction = min(1.0, self.fraction + RATE_LIMIT_INCREASE)
+            self._apply()
+
+    def on_throttled(self, epoch: int):
+        self.throttles += 1
+        if epoch != self.epoch:
+            return
+        self.epoch += 1
+        self.fraction = max(RATE_LIMIT_FLOOR, self.fraction / 2)
+        self._apply()
+        # Everyone waits for the slower refill before the next call goes out
+        self.requests.level = min(self.requests.level, 0.0)
+        print(f"[RateLimit] {self.model} throttled; cutting to {self.fraction:.0%} of quota "
+              f"({self.max_rpm * self.fraction:.0f} rpm).")
+
+    def stats(self) -> dict:
+        return {
+            "fraction_of_quota": round(self.fraction, 3),
+            "rpm": round(self.max_rpm * self.fraction, 1),
+            "tpm": round(self.max_tpm * self.fraction),
+            "max_rpm": self.max_rpm,
+            "max_tpm": self.max_tpm,
+            "calls": self.calls,
+            "throttles": self.throttles,
+            "requests_used": self.requests_used,
+            "tokens_used": self.tokens_used,
+            "waiting": {name: self.waiting[priority] for priority, name in PRIORITY_CLASSES.items()},
+        }
+
+
+def _parse_rate_limits(value: str = RATE_LIMITS) -> dict[str, tuple[int, int]]:
+    limits = {}
+    for item in value.split(","):
+        item = item.strip()
+        if "=" in item and ":" in item:
+            model, quota = item.split("=", 1)
+            rpm, tpm = quota.split(":", 1)
+            limits[model.strip()] = (int(rpm), int(tpm))
+    return limits
+
+
+_rate_limit_overrides = _parse_rate_limits()
+_rate_limiters: dict[str, AdaptiveRateLimiter] = {}
+
+
+def get_rate_limiter(model: str) -> AdaptiveRateLimiter:
+    limiter = _rate_limiters.get(model)
+    if limiter is None:
+        if model in _rate_limit_overrides:
+            rpm, tpm = _rate_limit_overrides[model]
+        elif "embedding" in model:
+            rpm, tpm = DEFAULT_EMBEDDING_RPM, DEFAULT_EMBEDDING_TPM
+        else:
+            rpm, tpm = DEFAULT_GENERATION_RPM, DEFAULT_GENERATION_TPM
+        limiter = _rate_limiters[model] = AdaptiveRateLimiter(model, rpm, tpm)
+    return limiter
+
+
+def rate_limit_stats() -> dict:
+    return {model: limiter.stats() for model, limiter in _rate_limiters.items()}
+
+
+def _used_tokens(response) -> int | None:
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) or None
+
+
+async def rate_limited(model: str, call, requests: int = 1, tokens: int = 1, retries: int = RATE_LIMIT_RETRIES):
+    """
+    Runs `call()` (a coroutine factory) under the model's limiter. ResourceExhausted cuts the
+    model's rate and the call is retried once the (slower) buckets admit it again.
+    """
+    limiter = get_rate_limiter(model)
+    for attempt in range(retries):
+        epoch = await limiter.acquire(requests, tokens)
+        try:
+            result = await call()
+        except exceptions.ResourceExhausted:
+            limiter.on_throttled(epoch)
+            if attempt == retries - 1:
+                raise
+            print(f"Rate limited on {model}, retry {attempt + 1}/{retries - 1}...")
+            continue
+        limiter.on_success(tokens, _used_tokens(result))
+        return result
+
+
+class RateLimitedChat:
+    """ChatSession wrapper whose sends go through the model's rate limiter."""
+
+    def __init__(self, model_name: str, chat):
+        self._model_name = model_name
+        self._chat = chat
+
+    async def send_message_async(self, content, **kwargs):
+        return await rate_limited(
+            self._model_name,
+            lambda: self._chat.send_message_async(content, **kwargs),
+            tokens=estimate_tokens(content),
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
 class RetryingGenerativeModel:
     def __init__(self, model_name: str, **kwargs):
+        self.model_name = model_name
         self._model = genai.GenerativeModel(model_name, **kwargs)
 
 
     async def generate_content_async(self, *args, **kwargs):
-        retries = 5  # Increased from 3
-        delay = 3    # Increased from 2
-        
         # Add extended timeout for complex queries
         if 'request_options' not in kwargs:
             kwargs['request_options'] = RequestOptions(timeout=REQUEST_TIMEOUT)
-        
-        for attempt in range(retries):
-            try:
-                return await self._model.generate_content_async(*args, **kwargs)
-            except exceptions.ResourceExhausted:
-                if attempt == retries - 1:
-                    raise
-                wait_time = delay * (2 ** attempt)
-                print(f"Rate limited, waiting {wait_time}s before retry {attempt + 1}/{retries}...")
-                await asyncio.sleep(wait_time)
+
+        return await rate_limited(
+            self.model_name,
+            lambda: self._model.generate_content_async(*args, **kwargs),
+            tokens=estimate_tokens(args[0] if args else kwargs.get("contents")),
+        )
 
     async def generate_content_stream_async(self, *args, **kwargs):
-        """Streaming version with retries"""
-        retries = 3
-        delay = 2
-        
+        """Streaming version; rate limited and retried like generate_content_async"""
         if 'request_options' not in kwargs:
             kwargs['request_options'] = RequestOptions(timeout=REQUEST_TIMEOUT)
-            
-        for attempt in range(retries):
-            try:
-                async for chunk in await self._model.generate_content_async(*args, stream=True, **kwargs):
-                    yield chunk
-                return # Success
-            except exceptions.ResourceExhausted:
-                if attempt == retries - 1:
-                    raise
-                wait_time = delay * (2 ** attempt)
-                await asyncio.sleep(wait_time)
+
+        response = await rate_limited(
+            self.model_name,
+            lambda: self._model.generate_content_async(*args, stream=True, **kwargs),
+            tokens=estimate_tokens(args[0] if args else kwargs.get("contents")),
+        )
+        async for chunk in response:
+            yield chunk
+
+    def start_chat(self, **kwargs) -> RateLimitedChat:
+        return RateLimitedChat(self.model_name, self._model.start_chat(**kwargs))
 
     def __getattr__(self, name):
         return getattr(self._model, name)
@@ -67,21 +344,142 @@ def get_model(model_name: str = "gemini-2.0-flash", **kwargs):
     return RetryingGenerativeModel(model_name, **kwargs)
 
 
-async def get_embedding(text: str) -> list[float]:
-    retries = 5  # Increased from 3
-    delay = 3    # Increased from 2
-    for attempt in range(retries):
-        try:
-            result = genai.embed_content(
-                model="models/gemini-embedding-001",
-                content=text,
-                task_type="retrieval_query"
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+
+# Limits for packing chunks into a single batchEmbedContents request.
+# The API caps a batch at 100 contents; the byte budget keeps large 10-K
+# chunks from producing oversized request payloads.
+EMBED_BATCH_MAX_ITEMS = int(os.getenv("EMBED_BATCH_MAX_ITEMS", "100"))
+EMBED_BATCH_MAX_BYTES = int(os.getenv("EMBED_BATCH_MAX_BYTES", "250000"))
+
+# genai.embed_content is synchronous, so it runs on a dedicated bounded pool
+# instead of the event loop. This caps in-flight embedding requests per process.
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "8"))
+_embedding_executor = ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY, thread_name_prefix="embed")
+
+
+async def _embed_with_retries(content, task_type: str):
+    """Calls the embedding API through the rate limiter. `content` may be a str or a list of str."""
+    loop = asyncio.get_running_loop()
+    result = await rate_limited(
+        EMBEDDING_MODEL,
+        lambda: loop.run_in_executor(
+            _embedding_executor,
+            functools.partial(
+                genai.embed_content,
+                model=EMBEDDING_MODEL,
+                content=content,
+                task_type=task_type
             )
-            return result['embedding']
+        ),
+        requests=len(content) if isinstance(content, list) else 1,
+        tokens=estimate_tokens(content),
+    )
+    return result['embedding']
+
+
+async def get_embedding(text: str, task_type: str = "retrieval_query") -> list[float]:
+    # Both cache tiers are read off the event loop (the disk tier is a blocking SQLite query)
+    cached = await asyncio.to_thread(embedding_cache.get, EMBEDDING_MODEL, task_type, text)
+    if cached is not None:
+        return cached
+    embedding = await _embed_with_retries(text, task_type)
+    # The disk tier commits to SQLite; keep that off the event loop too
+    await asyncio.to_thread(embedding_cache.put, EMBEDDING_MODEL, task_type, text, embedding)
+    return embedding
+
+
+def shorten_embedding(embedding: list[float], dimensions: int = 768) -> list[float]:
+    """
+    Truncates a Matryoshka embedding to its first `dimensions` values and renormalizes
+    it to unit length (matches l2_normalize(subvector(...)) used for SQL backfills).
+    """
+    prefix = embedding[:dimensions]
+    norm = math.sqrt(sum(x * x for x in prefix))
+    if norm == 0:
+        return prefix
+    return [x / norm for x in prefix]
+
+
+def binary_quantize(embedding: list[float]) -> bytes:
+    """
+    Packs the sign of each dimension into bits, most significant bit first
+    (matches pgvector's binary_quantize: 1 where the value is > 0).
+    The bytes bind directly to a bit(n) column.
+    """
+    packed = bytearray((len(embedding) + 7) // 8)
+    for i, x in enumerate(embedding):
+        if x > 0:
+            packed[i >> 3] |= 0x80 >> (i & 7)
+    return bytes(packed)
+
+
+def _pack_batches(texts: list[str]) -> list[list[int]]:
+    """Groups text indices into batches bounded by item count and UTF-8 byte size."""
+    batches = []
+    current = []
+    current_bytes = 0
+    for i, text in enumerate(texts):
+        size = len(text.encode("utf-8"))
+        if current and (len(current) >= EMBED_BATCH_MAX_ITEMS or current_bytes + size > EMBED_BATCH_MAX_BYTES):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append(i)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def get_embeddings_batch(texts: list[str], task_type: str = "retrieval_query") -> list[list[float] | None]:
+    """
+    Embeds many texts using multi-content embed requests.
+    Returns one embedding per input, in order. If a batch is rejected for a reason
+    other than rate limiting, its items are retried one by one; items that still
+    fail come back as None so callers can skip them instead of losing the whole batch.
+    """
+    results: list[list[float] | None] = [None] * len(texts)
+
+    # Serve what we can from the cache and embed each distinct missing text once
+    pending: dict[str, list[int]] = {}
+    cached_embeddings = await asyncio.to_thread(embedding_cache.get_many, EMBEDDING_MODEL, task_type, texts)
+    for i, (text, cached) in enumerate(zip(texts, cached_embeddings)):
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(text, []).append(i)
+
+    missing = list(pending)
+    embedded: list[list[float] | None] = [None] * len(missing)
+
+    async def embed_batch(batch: list[int]):
+        contents = [missing[i] for i in batch]
+        try:
+            embeddings = await _embed_with_retries(contents, task_type)
+            for i, embedding in zip(batch, embeddings):
+                embedded[i] = embedding
+            return
         except exceptions.ResourceExhausted:
-            if attempt == retries - 1:
+            raise
+        except Exception as e:
+            print(f"Batch embedding of {len(batch)} items failed ({e}), retrying individually...")
+
+        for i in batch:
+            try:
+                embedded[i] = await _embed_with_retries(missing[i], task_type)
+            except exceptions.ResourceExhausted:
                 raise
-            wait_time = delay * (2 ** attempt)
-            print(f"Embedding rate limited, waiting {wait_time}s before retry {attempt + 1}/{retries}...")
-            await asyncio.sleep(wait_time)
+            except Exception as e:
+                print(f"Embedding failed for item {i}: {e}")
+
+    # Batches run concurrently; the embedding pool bounds how many are in flight
+    await asyncio.gather(*(embed_batch(batch) for batch in _pack_batches(missing)))
+
+    fresh = [(text, embedding) for text, embedding in zip(missing, embedded) if embedding is not None]
+    await asyncio.to_thread(embedding_cache.put_many, EMBEDDING_MODEL, task_type, fresh)
+    for text, embedding in fresh:
+        for i in pending[text]:
+            results[i] = embedding
 
+    return results
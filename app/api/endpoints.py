@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
@@ -6,28 +6,26 @@ from sqlalchemy.ext.asyncio import AsyncSession
 import asyncio
 import json
 
-from app.database import get_db, AsyncSessionLocal
+from app.database import get_db
 from app.schemas import AnalysisRequest, AnalysisResponse
-from app.models import Filing
 from app.agents.planner import PlannerAgent
-from app.agents.search import SearchAgent
+from app.services.search_executor import SearchExecutor
 from app.agents.reviewer import ReviewerAgent
-from app.agents.utils import get_embedding, get_model
+from app.agents.utils import get_model, rate_limit_stats
+from app.agents.embedding_cache import embedding_cache
+from app.services.vector_cache import filing_matrix_cache
+from app.services.text_cache import filing_text_cache
 
 router = APIRouter()
 
 from app.agents.classifier import ClassifierAgent
 from app.agents.analyst import AnalystAgent
 from app.services.ingestion_service import IngestionService
-
-async def background_ingestion_task(ticker: str, year: int):
-    """Wrapper to run full ingestion in background with its own DB session."""
-    async with AsyncSessionLocal() as db:
-        service = IngestionService(db)
-        await service.ingest_background(ticker, year)
+from app.services.job_queue import enqueue_ingestion, get_jobs
+from app.services.ingestion_progress import get_coverage
 
 @router.post("/analyze")
-async def analyze_filing(request: AnalysisRequest, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+async def analyze_filing(request: AnalysisRequest, db: AsyncSession = Depends(get_db)):
     async def event_generator():
         # 0. Classify / Extract Metadata
         tickers = [request.ticker] if request.ticker else None
@@ -64,20 +62,27 @@ async def analyze_filing(request: AnalysisRequest, background_tasks: BackgroundT
 
         # 3. PRIORITY INGESTION (Split Strategy)
         ingester = IngestionService(db)
-        for ticker in tickers:
-            if ticker != "UNKNOWN":
-                # Fast Path: Priority Chunks (Foreground, Awaited)
-                # This grabs just the financial statements (~5-10 chunks) quickly
-                await ingester.ingest_priority(ticker, year)
-                
-                # Slow Path: Full Ingestion (Background, Fire-and-Forget)
-                # This processes the rest of the 10-K without blocking the user
-                background_tasks.add_task(background_ingestion_task, ticker, year)
+        known_tickers = [t for t in tickers if t != "UNKNOWN"]
+        prior_coverage = await get_coverage(db, [(t, year) for t in known_tickers])
+        for ticker in known_tickers:
+            # Fast Path: Priority Chunks (Foreground, Awaited)
+            # This grabs just the financial statements (~5-10 chunks) quickly
+            await ingester.ingest_priority(ticker, year)
+
+            # Slow Path: Full Ingestion (Durable Job Queue)
+            # This processes the rest of the 10-K without blocking the user. Concurrent
+            # requests for the same filing share one job, and it survives restarts. Filings
+            # that aren't complete under the current parser (new, deleted, or a version bump)
+            # get a new job even if an earlier one succeeded.
+            if prior_coverage[(ticker, year)]["status"] != "complete":
+                await enqueue_ingestion(db, ticker, year)
 
         # 4. Search & Context Accumulation
-        search_agent = SearchAgent(db)
-        search_tasks = []
-        
+        # Group every (step, ticker) query by ticker so each ticker costs one batched
+        # embedding call and one SQL statement, whatever the number of steps.
+        queries_by_ticker: dict[str, list[str]] = {}
+        query_order = []
+
         for step in steps:
             step_lower = step.lower()
             target_tickers = []
@@ -92,13 +97,29 @@ async def analyze_filing(request: AnalysisRequest, background_tasks: BackgroundT
                 query_text = step
                 if "Directly extract" in step:
                     query_text = f"Consolidated Statements of Operations {t} {year} Revenue Net Income"
-                
-                search_tasks.append(search_agent.search(query_text, t, year, limit=3)) # Optimized limit
-        
-        if search_tasks:
-            all_results = await asyncio.gather(*search_tasks)
-        else:
-            all_results = []
+
+                ticker_queries = queries_by_ticker.setdefault(t, [])
+                query_order.append((t, len(ticker_queries)))
+                ticker_queries.append(query_text)
+
+        # Tickers are searched in parallel, each on its own pooled connection
+        # (the request-scoped session can't be shared across concurrent tasks)
+        search_executor = SearchExecutor()
+        ticker_results = await asyncio.gather(*(
+            search_executor.search_batch(ticker_queries, t, year, limit=3) # Optimized limit
+            for t, ticker_queries in queries_by_ticker.items()
+        ))
+        results_by_ticker = dict(zip(queries_by_ticker, ticker_results))
+
+        # Tell the user when answers come from a filing that's only partly indexed so far
+        coverage = await get_coverage(db, [(t, year) for t in queries_by_ticker])
+        for (t, _), info in coverage.items():
+            if info["status"] == "partial":
+                progress_text = f" ({info['chunks_stored']} of ~{info['total_chunks']} sections)" if info["total_chunks"] else ""
+                yield f"data: {json.dumps({'type': 'status', 'text': f'{t} {year} is still being indexed{progress_text}; results may be incomplete.'})}\n\n"
+
+        # Keep the original step-by-step ordering of results
+        all_results = [results_by_ticker[t][i] for t, i in query_order]
 
         all_context = []
         for results in all_results:
@@ -150,22 +171,49 @@ async def ingest_filing(request: IngestRequest, db: AsyncSession = Depends(get_d
     
     if request.text:
         # Manual text ingestion still uses robust cleaning/chunking
-        clean_text = ingester.advanced_clean(request.text)
-        chunks = ingester.smart_chunk(clean_text)
-        for i, chunk in enumerate(chunks):
-            embedding = await get_embedding(chunk)
-            filing = Filing(
-                ticker=request.ticker,
-                year=request.year,
-                chunk_index=i,
-                text_content=chunk,
-                embedding=embedding
-            )
-            db.add(filing)
-        await db.commit()
+        chunks = await ingester.ingest_text(request.ticker, request.year, request.text)
         return {"message": f"Manually ingested {len(chunks)} chunks for {request.ticker} {request.year}"}
     
     # Download path
     await ingester.ingest_if_missing(request.ticker, request.year)
     return {"message": f"Processing complete for {request.ticker} {request.year}"}
 
+
+@router.get("/ingest/jobs")
+async def ingestion_jobs(ticker: Optional[str] = None, year: Optional[int] = None, limit: int = 50,
+                         db: AsyncSession = Depends(get_db)):
+    return await get_jobs(db, ticker.upper() if ticker else None, year, limit)
+
+
+@router.get("/ingest/jobs/{job_id}")
+async def ingestion_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    jobs = await get_jobs(db, job_id=job_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs[0]
+
+
+@router.get("/ingest/coverage")
+async def ingestion_coverage(ticker: str, year: int, db: AsyncSession = Depends(get_db)):
+    ticker = ticker.upper()
+    return (await get_coverage(db, [(ticker, year)]))[(ticker, year)]
+
+
+@router.get("/stats/embedding-cache")
+async def embedding_cache_stats():
+    return embedding_cache.stats()
+
+
+@router.get("/stats/vector-cache")
+async def vector_cache_stats():
+    return filing_matrix_cache.stats()
+
+
+@router.get("/stats/text-cache")
+async def text_cache_stats():
+    return filing_text_cache.stats()
+
+
+@router.get("/stats/rate-limits")
+async def rate_limits():
+    return rate_limit_stats()
@@ -1,13 +1,32 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+import asyncio
 from app.database import init_db
+from app.services.vector_index import ensure_vector_indexes
+from app.services.vector_cache import filing_matrix_cache, parse_warm_list
+from app.services.text_processing import shutdown_parse_pool
+from app.services.job_queue import run_workers, INGEST_WORKERS
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    # Build the ANN indexes in the background; the build is concurrent so we can serve meanwhile
+    index_task = asyncio.create_task(ensure_vector_indexes())
+    # Optionally preload hot (ticker, year) matrices for the "memory" search mode
+    warm_pairs = parse_warm_list()
+    warm_task = asyncio.create_task(filing_matrix_cache.warm(warm_pairs)) if warm_pairs else None
+    # In-process ingestion workers (more can run elsewhere via ingest_worker.py)
+    worker_task = asyncio.create_task(run_workers(INGEST_WORKERS)) if INGEST_WORKERS > 0 else None
     yield
     # Shutdown
+    index_task.cancel()
+    if warm_task:
+        warm_task.cancel()
+    if worker_task:
+        # Interrupted jobs are picked up again once their lease expires
+        worker_task.cancel()
+    shutdown_parse_pool()
 
 from app.api.endpoints import router
 from fastapi.middleware.cors import CORSMiddleware
@@ -1,25 +1,99 @@
-from sqlalchemy import Column, Integer, String, Text, Computed
+from sqlalchemy import Column, Integer, String, Text, Boolean, Float, Index, Computed, DateTime, func, text
 from sqlalchemy.dialects.postgresql import TSVECTOR
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import Vector, BIT
 from app.database import Base
 
 
 class Filing(Base):
     __tablename__ = "filings"
+    __table_args__ = (
+        # Chunk writes are idempotent upserts against this (ON CONFLICT DO NOTHING)
+        Index("uq_filings_ticker_year_hash", "ticker", "year", "content_hash", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     ticker = Column(String, index=True)
     year = Column(Integer, index=True)
     chunk_index = Column(Integer)
     text_content = Column(Text)
+    # sha256 hex of text_content
+    content_hash = Column(String(64))
     # Using 3072 dimensions for Gemini embeddings (embedding-001)
     # Adjust dimension if using a different model
     embedding = Column(Vector(3072))
+    # Matryoshka prefix: first 768 dims of `embedding`, renormalized to unit length.
+    # Used for cheap first-stage ANN recall before reranking on the full vector.
+    embedding_short = Column(Vector(768))
+    # Binary-quantized signature of `embedding` (sign bit per dimension) for Hamming prefiltering
+    embedding_bits = Column(BIT(3072))
     
     # Full text search vector
     # 'english' configuration is standard
     search_vector = Column(TSVECTOR)
 
+    # Financial-boost features, computed once at ingestion (app.services.chunk_features)
+    dollar_count = Column(Integer)
+    large_number_count = Column(Integer)
+    has_income_keyword = Column(Boolean)
+    has_section_header = Column(Boolean)
+    financial_boost = Column(Float)
+
 
     def __repr__(self):
         return f"<Filing(ticker={self.ticker}, year={self.year}, chunk={self.chunk_index})>"
+
+
+class IngestionJob(Base):
+    """Durable background-ingestion work item, claimed by workers with FOR UPDATE SKIP LOCKED."""
+    __tablename__ = "ingestion_jobs"
+    __table_args__ = (
+        # Single flight: at most one queued/running job per filing. Finished jobs don't block
+        # a new one, so a filing can be re-ingested after a version bump or deletion.
+        Index(
+            "uq_ingestion_jobs_inflight", "ticker", "year", unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+        Index("idx_ingestion_jobs_claim", "status", "run_after"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    ticker = Column(String, nullable=False)
+    year = Column(Integer, nullable=False)
+    # queued -> running -> succeeded | queued (retry) | failed
+    status = Column(String, nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    # Earliest time the job may be claimed (retry backoff)
+    run_after = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Lease: a running job whose lease expired (worker died) is claimable again
+    locked_by = Column(String)
+    locked_until = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    finished_at = Column(DateTime(timezone=True))
+
+    def __repr__(self):
+        return f"<IngestionJob(ticker={self.ticker}, year={self.year}, status={self.status})>"
+
+
+class IngestionProgress(Base):
+    """Checkpoint of a filing's full (background) ingestion, committed together with its chunks."""
+    __tablename__ = "ingestion_progress"
+
+    ticker = Column(String, primary_key=True)
+    year = Column(Integer, primary_key=True)
+    # in_progress | complete
+    status = Column(String, nullable=False, default="in_progress")
+    # Chunk boundaries depend on both; a version change restarts ingestion from the first chunk
+    parser_version = Column(String, nullable=False)
+    chunker_version = Column(String, nullable=False)
+    # Known once the whole filing has been chunked
+    total_chunks = Column(Integer)
+    # Highest chunk_index committed so far (background chunks start at 1000)
+    last_chunk_index = Column(Integer)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    completed_at = Column(DateTime(timezone=True))
+
+    def __repr__(self):
+        return f"<IngestionProgress(ticker={self.ticker}, year={self.year}, status={self.status})>"
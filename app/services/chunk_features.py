@@ -0,0 +1,49 @@
+import re
+
+# Features behind SearchAgent's financial boost. They depend only on the chunk text,
+# so they're computed once at ingestion and stored on the filings row.
+
+LARGE_NUMBER_PATTERN = re.compile(r'\d{1,3}(?:,\d{3})+|\d+\.\d+\s*(?:million|billion)?', re.IGNORECASE)
+INCOME_KEYWORDS = ['net income', 'net sales', 'total revenue', 'operating income', 'gross profit', 'earnings per share', 'diluted']
+SECTION_HEADERS = ['consolidated statements of operations', 'summary of financial data', 'item 8. financial statements']
+
+
+def financial_boost(dollar_count: int, large_number_count: int, has_income_keyword: bool, has_section_header: bool) -> float:
+    """
+    Returns a boost factor for chunks containing financial data.
+    Chunks with $ signs, large numbers, and table-like structures get higher scores.
+    """
+    boost = 1.0
+
+    # Count dollar signs (strong indicator of financial data)
+    if dollar_count >= 5:
+        boost += 0.5
+    elif dollar_count >= 2:
+        boost += 0.3
+
+    # Count large numbers (millions/billions patterns)
+    if large_number_count >= 3:
+        boost += 0.4
+
+    # Boost for income statement keywords
+    if has_income_keyword:
+        boost += 0.2
+
+    # Section header prioritization for higher precision extraction
+    if has_section_header:
+        boost += 0.5
+
+    return boost
+
+
+def compute_financial_features(text_content: str) -> dict:
+    """Extracts the boost features of a chunk, keyed by their filings column names."""
+    lowered = text_content.lower()
+    features = {
+        "dollar_count": text_content.count('$'),
+        "large_number_count": len(LARGE_NUMBER_PATTERN.findall(text_content)),
+        "has_income_keyword": any(kw in lowered for kw in INCOME_KEYWORDS),
+        "has_section_header": any(header in lowered for header in SECTION_HEADERS),
+    }
+    features["financial_boost"] = financial_boost(**features)
+    return features
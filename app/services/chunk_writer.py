@@ -0,0 +1,126 @@
+import os
+from dataclasses import dataclass
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Filing
+from app.agents.utils import shorten_embedding, binary_quantize
+from app.agents.embedding_cache import text_hash
+from app.services.chunk_features import compute_financial_features
+from app.services.vector_index import VECTOR_DIMENSIONS, SHORT_VECTOR_DIMENSIONS
+
+# "copy": asyncpg COPY into a staging table, then one INSERT ... SELECT per batch.
+# "insert": multi-row INSERT ... VALUES batches (works on any driver/connection).
+CHUNK_WRITE_MODE = os.getenv("CHUNK_WRITE_MODE", "copy")
+CHUNK_WRITE_BATCH_SIZE = int(os.getenv("CHUNK_WRITE_BATCH_SIZE", "500"))
+
+FEATURE_COLUMNS = ["dollar_count", "large_number_count", "has_income_keyword", "has_section_header", "financial_boost"]
+STAGE_COLUMNS = ["ticker", "year", "chunk_index", "text_content", "content_hash", "embedding"] + FEATURE_COLUMNS
+
+# Vectors are staged as text so COPY needs no custom binary codecs; the derived
+# short/bit vectors are computed set-wise on the way into filings.
+STAGE_TABLE_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS filings_stage (
+        ticker varchar,
+        year integer,
+        chunk_index integer,
+        text_content text,
+        content_hash varchar(64),
+        embedding text,
+        dollar_count integer,
+        large_number_count integer,
+        has_income_keyword boolean,
+        has_section_header boolean,
+        financial_boost double precision
+    ) ON COMMIT DELETE ROWS
+"""
+
+STAGE_INSERT_SQL = f"""
+    INSERT INTO filings (
+        ticker, year, chunk_index, text_content, content_hash, embedding, embedding_short, embedding_bits,
+        {", ".join(FEATURE_COLUMNS)}
+    )
+    SELECT
+        ticker, year, chunk_index, text_content, content_hash,
+        embedding::vector({VECTOR_DIMENSIONS}),
+        l2_normalize(subvector(embedding::vector({VECTOR_DIMENSIONS}), 1, {SHORT_VECTOR_DIMENSIONS})),
+        binary_quantize(embedding::vector({VECTOR_DIMENSIONS}))::bit({VECTOR_DIMENSIONS}),
+        {", ".join(FEATURE_COLUMNS)}
+    FROM filings_stage
+    ON CONFLICT DO NOTHING
+"""
+
+
+@dataclass
+class ChunkRecord:
+    ticker: str
+    year: int
+    chunk_index: int
+    text_content: str
+    embedding: list[float]
+
+
+class ChunkWriter:
+    """
+    Bulk writer for filings rows. Writes within the session's current transaction;
+    the caller commits.
+    Writes are idempotent: a chunk whose text already exists for the same (ticker, year)
+    is skipped via the unique content_hash index, so retries never duplicate rows.
+    """
+
+    def __init__(self, db: AsyncSession, mode: str = CHUNK_WRITE_MODE, batch_size: int = CHUNK_WRITE_BATCH_SIZE):
+        if mode not in ("copy", "insert"):
+            raise ValueError(f"Unknown chunk write mode: {mode}")
+        self.db = db
+        self.mode = mode
+        self.batch_size = batch_size
+
+    async def write(self, records: list[ChunkRecord]) -> int:
+        """Writes the records in batches. Returns the number of new rows (duplicates are skipped)."""
+        written = 0
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            if self.mode == "copy":
+                written += await self._copy_batch(batch)
+            else:
+                written += await self._insert_batch(batch)
+        return written
+
+    async def _copy_batch(self, batch: list[ChunkRecord]) -> int:
+        # Running the DDL through the session also opens the transaction the COPY joins
+        await self.db.execute(text(STAGE_TABLE_DDL))
+        await self.db.execute(text("TRUNCATE filings_stage"))
+
+        rows = []
+        for r in batch:
+            features = compute_financial_features(r.text_content)
+            embedding = "[" + ",".join(map(str, r.embedding)) + "]"
+            rows.append((r.ticker, r.year, r.chunk_index, r.text_content, text_hash(r.text_content), embedding,
+                         *(features[c] for c in FEATURE_COLUMNS)))
+
+        conn = await self.db.connection()
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table("filings_stage", records=rows, columns=STAGE_COLUMNS)
+
+        result = await self.db.execute(text(STAGE_INSERT_SQL))
+        return result.rowcount
+
+    async def _insert_batch(self, batch: list[ChunkRecord]) -> int:
+        rows = [
+            {
+                "ticker": r.ticker,
+                "year": r.year,
+                "chunk_index": r.chunk_index,
+                "text_content": r.text_content,
+                "content_hash": text_hash(r.text_content),
+                "embedding": r.embedding,
+                "embedding_short": shorten_embedding(r.embedding, SHORT_VECTOR_DIMENSIONS),
+                "embedding_bits": binary_quantize(r.embedding),
+                **compute_financial_features(r.text_content),
+            }
+            for r in batch
+        ]
+        # executemany on a core insert is sent as multi-row INSERT ... VALUES batches
+        stmt = insert(Filing.__table__).on_conflict_do_nothing().returning(Filing.__table__.c.id)
+        result = await self.db.execute(stmt, rows)
+        return len(result.all())
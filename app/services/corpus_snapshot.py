@@ -0,0 +1,205 @@
+import os
+import json
+import hashlib
+import asyncio
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import select, func, any_, bindparam, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Filing
+from app.agents.utils import EMBEDDING_MODEL
+from app.agents.embedding_cache import text_hash
+from app.services.chunk_writer import ChunkWriter, ChunkRecord
+from app.services.vector_index import VECTOR_DIMENSIONS
+from app.services import ingestion_progress
+
+# A snapshot is a directory of one compressed .npz per (ticker, year) plus manifest.json,
+# which records each file's sha256 and row count. Per file:
+#   embeddings     (n, dims) float16 (or float32)
+#   chunk_index    (n,) int32
+#   content_hash   (n,) S64, sha256 hex of each chunk's text
+#   text_utf8      (total_bytes,) uint8, all chunk texts concatenated
+#   text_offsets   (n + 1,) int64, chunk i is text_utf8[offsets[i]:offsets[i + 1]]
+# Derived columns (short/bit vectors, financial features, search vector) aren't stored;
+# import recomputes them exactly as ingestion does.
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+EMBEDDING_DTYPES = {"float16": np.float16, "float32": np.float32}
+
+
+class SnapshotError(Exception):
+    """A snapshot file is missing, corrupt, or doesn't match this database's schema."""
+
+
+def snapshot_filename(ticker: str, year: int) -> str:
+    return f"{ticker}_{year}.npz"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(directory: str) -> dict:
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        raise SnapshotError(f"No {MANIFEST_NAME} in {directory}")
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format version {manifest.get('format_version')}")
+    if manifest.get("dimensions") != VECTOR_DIMENSIONS:
+        raise SnapshotError(f"Snapshot vectors have {manifest.get('dimensions')} dims, database expects {VECTOR_DIMENSIONS}")
+    if manifest.get("embedding_model") != EMBEDDING_MODEL:
+        raise SnapshotError(f"Snapshot was embedded with {manifest.get('embedding_model')}, "
+                            f"this deployment queries with {EMBEDDING_MODEL}")
+    return manifest
+
+
+def write_manifest(directory: str, filings: list[dict]):
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "embedding_model": EMBEDDING_MODEL,
+        "dimensions": VECTOR_DIMENSIONS,
+        "filings": sorted(filings, key=lambda f: (f["ticker"], f["year"])),
+    }
+    tmp_path = os.path.join(directory, f"{MANIFEST_NAME}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+
+
+def _write_npz(path: str, chunk_indices: list[int], texts: list[str], hashes: list[str],
+               embeddings: list, dtype: str) -> str:
+    encoded = [t.encode("utf-8") for t in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    matrix = np.stack([np.asarray(e, dtype=np.float32) for e in embeddings])
+    if dtype == "float16" and np.abs(matrix).max() > np.finfo(np.float16).max:
+        raise SnapshotError(f"Embeddings in {path} overflow float16; export with float32")
+
+    tmp_path = f"{path}.tmp.npz"
+    np.savez_compressed(
+        tmp_path,
+        embeddings=matrix.astype(EMBEDDING_DTYPES[dtype]),
+        chunk_index=np.asarray(chunk_indices, dtype=np.int32),
+        content_hash=np.asarray(hashes, dtype="S64"),
+        text_utf8=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        text_offsets=offsets,
+    )
+    os.replace(tmp_path, path)
+    return file_sha256(path)
+
+
+async def list_filings(db: AsyncSession, tickers: list[str] | None = None,
+                       years: list[int] | None = None) -> list[tuple[str, int]]:
+    stmt = select(Filing.ticker, Filing.year).distinct().order_by(Filing.ticker, Filing.year)
+    if tickers:
+        stmt = stmt.where(Filing.ticker.in_(tickers))
+    if years:
+        stmt = stmt.where(Filing.year.in_(years))
+    return [(ticker, year) for ticker, year in (await db.execute(stmt)).all()]
+
+
+async def export_filing(db: AsyncSession, directory: str, ticker: str, year: int, dtype: str = "float16") -> dict | None:
+    """Writes one (ticker, year) to the snapshot directory; returns its manifest entry (None if it has no embedded rows)."""
+    rows = (await db.execute(
+        select(Filing.chunk_index, Filing.text_content, Filing.content_hash, Filing.embedding)
+        .where(Filing.ticker == ticker, Filing.year == year, Filing.embedding.is_not(None))
+        .order_by(Filing.chunk_index, Filing.id)
+    )).all()
+    if not rows:
+        return None
+    progress = await ingestion_progress.get_progress(db, ticker, year)
+
+    texts = [r.text_content or "" for r in rows]
+    filename = snapshot_filename(ticker, year)
+    sha256 = await asyncio.to_thread(
+        _write_npz,
+        os.path.join(directory, filename),
+        [r.chunk_index if r.chunk_index is not None else -1 for r in rows],
+        texts,
+        [r.content_hash or text_hash(t) for r, t in zip(rows, texts)],
+        [r.embedding for r in rows],
+        dtype,
+    )
+    return {
+        "ticker": ticker,
+        "year": year,
+        "file": filename,
+        "rows": len(rows),
+        "sha256": sha256,
+        "embedding_dtype": dtype,
+        "progress": None if progress is None else {
+            "status": progress.status,
+            "parser_version": progress.parser_version,
+            "chunker_version": progress.chunker_version,
+            "total_chunks": progress.total_chunks,
+            "last_chunk_index": progress.last_chunk_index,
+        },
+    }
+
+
+def load_snapshot_file(directory: str, entry: dict) -> list[ChunkRecord]:
+    """Reads and verifies one snapshot file against its manifest entry. Raises SnapshotError on any mismatch."""
+    path = os.path.join(directory, entry["file"])
+    if not os.path.exists(path):
+        raise SnapshotError(f"{entry['file']} is missing")
+    if file_sha256(path) != entry["sha256"]:
+        raise SnapshotError(f"{entry['file']}: sha256 mismatch")
+
+    with np.load(path, allow_pickle=False) as data:
+        embeddings = data["embeddings"].astype(np.float32)
+        chunk_indices = data["chunk_index"]
+        hashes = data["content_hash"]
+        text_utf8 = data["text_utf8"].tobytes()
+        offsets = data["text_offsets"]
+
+    n = entry["rows"]
+    if embeddings.shape != (n, VECTOR_DIMENSIONS) or len(chunk_indices) != n or len(hashes) != n or len(offsets) != n + 1:
+        raise SnapshotError(f"{entry['file']}: arrays don't match the manifest ({n} rows of {VECTOR_DIMENSIONS} dims)")
+    if not np.isfinite(embeddings).all():
+        raise SnapshotError(f"{entry['file']}: non-finite embedding values")
+
+    records = []
+    for i in range(n):
+        chunk = text_utf8[offsets[i]:offsets[i + 1]].decode("utf-8")
+        if text_hash(chunk) != hashes[i].decode("ascii"):
+            raise SnapshotError(f"{entry['file']}: chunk {int(chunk_indices[i])} text doesn't match its content_hash")
+        records.append(ChunkRecord(entry["ticker"], entry["year"], int(chunk_indices[i]), chunk, embeddings[i].tolist()))
+    return records
+
+
+async def import_filing(db: AsyncSession, directory: str, entry: dict) -> int:
+    """
+    Loads one verified snapshot file through ChunkWriter (COPY) in a single transaction,
+    restores its ingestion progress, and checks afterwards that every snapshot chunk is stored.
+    Returns the number of new rows; existing identical chunks are skipped.
+    """
+    records = await asyncio.to_thread(load_snapshot_file, directory, entry)
+    ticker, year = entry["ticker"], entry["year"]
+
+    written = await ChunkWriter(db, mode="copy").write(records)
+    # Only this snapshot's chunks count: the filing may also hold priority chunks or rows from
+    # before the import. Rows are unique per content_hash, so duplicates in the file count once.
+    hashes = list({text_hash(r.text_content) for r in records})
+    stored = (await db.execute(
+        select(func.count()).select_from(Filing).where(
+            Filing.ticker == ticker, Filing.year == year,
+            Filing.content_hash == any_(bindparam("snapshot_hashes", value=hashes, type_=ARRAY(Text))),
+        )
+    )).scalar()
+    if stored < len(hashes):
+        await db.rollback()
+        raise SnapshotError(f"{ticker} {year}: only {stored} of {len(hashes)} snapshot chunks present after import")
+
+    progress = entry.get("progress")
+    if progress:
+        await ingestion_progress.restore(db, ticker, year, **progress)
+    await db.commit()
+    return written
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import threading
+
+
+class FilingManifest:
+    """
+    Persistent index of downloaded filings: (ticker, form, fiscal_year) -> path, accession.
+    Rows are recorded once, when a file first shows up on disk, so later lookups for
+    already-downloaded years need neither EDGAR nor a directory scan.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS filings (
+                ticker TEXT NOT NULL,
+                form TEXT NOT NULL,
+                fiscal_year INTEGER,
+                accession TEXT NOT NULL,
+                path TEXT NOT NULL UNIQUE,
+                PRIMARY KEY (ticker, form, accession)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_manifest_lookup ON filings (ticker, form, fiscal_year)"
+        )
+        self._conn.commit()
+
+    def lookup(self, ticker: str, form: str, fiscal_year: int) -> str | None:
+        """Returns the path of a recorded filing that still exists on disk."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM filings WHERE ticker = ? AND form = ? AND fiscal_year = ? ORDER BY accession",
+                (ticker, form, fiscal_year)
+            ).fetchall()
+        for (path,) in rows:
+            if os.path.exists(path):
+                return path
+        return None
+
+    def known_paths(self, ticker: str, form: str) -> set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM filings WHERE ticker = ? AND form = ?", (ticker, form)
+            ).fetchall()
+        return {path for (path,) in rows}
+
+    def record(self, ticker: str, form: str, fiscal_year: int | None, accession: str, path: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO filings (ticker, form, fiscal_year, accession, path) VALUES (?, ?, ?, ?, ?)",
+                (ticker, form, fiscal_year, accession, path)
+            )
+            self._conn.commit()
+
+
+_manifests: dict[str, FilingManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(path: str) -> FilingManifest:
+    """One shared manifest (and SQLite connection) per file, however many SECServices exist."""
+    with _manifests_lock:
+        if path not in _manifests:
+            _manifests[path] = FilingManifest(path)
+        return _manifests[path]
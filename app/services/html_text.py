@@ -0,0 +1,188 @@
+import os
+from html.parser import HTMLParser
+
+# HTML -> text engine used by SECService.clean_text:
+#   "stream": the stdlib html.parser tokenizer, streaming; same tokenizer as bs4, so identical
+#             output even on malformed markup (see scripts/verify_parser_parity.py)
+#   "bs4":    the original BeautifulSoup("html.parser") path; buffers the whole document
+#   "lxml":   libxml2's incremental HTML parser (C), streaming and ~3x faster than "stream", but
+#             NOT identical on malformed markup: libxml2 reports no events for stray end tags
+#             and treats <title>/<textarea> content as raw text, so adjacent blocks can merge.
+#             Opt-in only; the backend is part of PARSER_VERSION, so cached text never crosses backends.
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "stream")
+
+SKIP_TAGS = {"script", "style"}
+
+
+def normalize_block(data: str) -> str:
+    """Normalizes one text node the way clean_text always has."""
+    # Break into lines and remove leading and trailing space on each
+    lines = (line.strip() for line in data.splitlines())
+    # Break multi-headlines into a line each
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    # Drop blank lines
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+
+class _BlockCollector:
+    """
+    Shared text-node bookkeeping. A text node can arrive in several data callbacks (when it
+    spans feed() pieces or contains entities), so data is buffered until the next markup event.
+    """
+
+    def __init__(self):
+        self._skip_depth = 0
+        self._pending: list[str] = []
+        self._blocks: list[str] = []
+
+    def _start(self, tag: str):
+        self._flush()
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+
+    def _end(self, tag: str):
+        self._flush()
+        if tag in SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def _data(self, data: str):
+        if not self._skip_depth:
+            self._pending.append(data)
+
+    def _cdata(self, data: str):
+        # BeautifulSoup keeps CDATA sections as their own text node
+        self._flush()
+        self._data(data)
+        self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        block = normalize_block("".join(self._pending))
+        self._pending = []
+        if block:
+            self._blocks.append(block)
+
+    def drain(self) -> list[str]:
+        """Returns the text blocks completed so far."""
+        blocks, self._blocks = self._blocks, []
+        return blocks
+
+
+class StreamTextExtractor(_BlockCollector, HTMLParser):
+    """Incremental extractor on the stdlib html.parser tokenizer."""
+
+    def __init__(self):
+        _BlockCollector.__init__(self)
+        HTMLParser.__init__(self, convert_charrefs=True)
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag)
+
+    def handle_endtag(self, tag):
+        self._end(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        if data.startswith("CDATA["):
+            self._cdata(data[len("CDATA["):])
+        else:
+            self._flush()
+
+    def handle_data(self, data):
+        self._data(data)
+
+    def close(self):
+        HTMLParser.close(self)
+        self._flush()
+
+
+class _LxmlTarget:
+    """lxml parser target; forwards events to the extractor."""
+
+    def __init__(self, collector: _BlockCollector):
+        self._collector = collector
+        self.start = lambda tag, attrib: collector._start(tag)
+        self.end = collector._end
+        self.data = collector._data
+        self.comment = self._comment
+        self.pi = lambda target, data=None: collector._flush()
+        self.doctype = lambda *args: collector._flush()
+
+    def _comment(self, text):
+        # libxml2's HTML parser reports CDATA sections as comments
+        if text.startswith("[CDATA[") and text.endswith("]]"):
+            self._collector._cdata(text[len("[CDATA["):-2])
+        else:
+            self._collector._flush()
+
+    def close(self):
+        return None
+
+
+class LxmlTextExtractor(_BlockCollector):
+    """Incremental extractor on libxml2's HTML parser, driven through a parser target."""
+
+    def __init__(self):
+        super().__init__()
+        from lxml import etree
+        # huge_tree lifts libxml2's 10MB text-node limit (some filings embed huge tables)
+        self._parser = etree.HTMLParser(target=_LxmlTarget(self), huge_tree=True, recover=True)
+
+    def feed(self, data: str):
+        self._parser.feed(data)
+
+    def close(self):
+        self._parser.close()
+        self._flush()
+
+
+class Bs4TextExtractor(_BlockCollector):
+    """The original BeautifulSoup path. Kept as the parity reference; not incremental."""
+
+    def __init__(self):
+        super().__init__()
+        self._pieces: list[str] = []
+
+    def feed(self, data: str):
+        self._pieces.append(data)
+
+    def close(self):
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup("".join(self._pieces), "html.parser")
+        self._pieces = []
+
+        # Remove script and style elements
+        for script in soup(["script", "style"]):
+            script.extract()
+
+        block = normalize_block(soup.get_text(separator="\n\n"))
+        if block:
+            self._blocks.append(block)
+
+
+TEXT_BACKENDS = {
+    "lxml": LxmlTextExtractor,
+    "stream": StreamTextExtractor,
+    "bs4": Bs4TextExtractor,
+}
+# Backends whose output is identical to bs4's, malformed markup included
+# (scripts/verify_parser_parity.py); lxml is faster but diverges, see PARSER_BACKEND
+PARITY_BACKENDS = ("stream", "bs4")
+
+
+def get_text_extractor(backend: str = PARSER_BACKEND):
+    if backend not in TEXT_BACKENDS:
+        raise ValueError(f"Unknown parser backend: {backend}")
+    return TEXT_BACKENDS[backend]()
@@ -0,0 +1,237 @@
+import os
+import json
+import asyncio
+import tempfile
+import threading
+from concurrent.futures import Future, wait
+from typing import Awaitable, Callable, Iterable, Iterator
+from app.services.sec_service import iter_text_blocks
+from app.services.text_cache import FilingTextWriter, filing_text_cache
+from app.services.text_processing import IncrementalCleaner, IncrementalChunker, submit_to_parse_pool
+
+# Batches allowed to wait between stages (parsed-but-not-embedded and embedded-but-not-written).
+# Bounds memory and in-flight embed requests; the parser blocks when the queues are full.
+PIPELINE_DEPTH = int(os.getenv("PIPELINE_DEPTH", "4"))
+# How often a reader checks its spool file for batches a parse-pool worker has appended
+SPOOL_POLL_SECONDS = 0.05
+
+_DONE = object()
+
+
+def _batched(chunks: Iterable[str], batch_size: int) -> Iterator[list[str]]:
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_chunk_batches(html_path: str, batch_size: int, cache_writer: FilingTextWriter | None = None) -> Iterator[list[str]]:
+    """
+    Filing on disk -> batches of chunks, streaming: text blocks are extracted, cleaned and
+    chunked incrementally, so memory stays flat however large the filing is. The cleaned text
+    is tee'd into `cache_writer`; the caller commits (or aborts) it.
+    """
+    cleaner = IncrementalCleaner()
+    chunker = IncrementalChunker()
+
+    def chunks():
+        for block in iter_text_blocks(html_path):
+            cleaned = cleaner.feed(block)
+            if cache_writer is not None:
+                cache_writer.write(cleaned)
+            yield from chunker.feed(cleaned)
+        yield from chunker.finish()
+
+    yield from _batched(chunks(), batch_size)
+
+
+def text_chunk_batches(pieces: Iterable[str], batch_size: int) -> Iterator[list[str]]:
+    """Already-cleaned text (in pieces, e.g. streamed from the text cache) -> batches of chunks."""
+    chunker = IncrementalChunker()
+
+    def chunks():
+        for piece in pieces:
+            yield from chunker.feed(piece)
+        yield from chunker.finish()
+
+    yield from _batched(chunks(), batch_size)
+
+
+def _spool(batches: Iterable[list[str]], spool_path: str):
+    # "r+": if the reader has already given up and removed the spool, stop instead of recreating it
+    with open(spool_path, "r+", encoding="utf-8") as spool:
+        for batch in batches:
+            spool.write(json.dumps(batch) + "\n")
+            spool.flush()
+
+
+def spool_filing(spool_path: str, html_path: str, batch_size: int,
+                 cache_key: tuple[str, int, str, str] | None = None) -> tuple[str, int] | None:
+    """
+    Parse-pool worker: streams the filing's chunk batches into the spool file and its cleaned
+    text into a text-cache temp file. Returns that file as (temp path, chars) for the parent
+    process to publish; the cache index isn't touched from pool workers.
+    """
+    cache_writer = filing_text_cache.writer(*cache_key) if cache_key else None
+    try:
+        _spool(parse_chunk_batches(html_path, batch_size, cache_writer), spool_path)
+    except BaseException:
+        if cache_writer is not None:
+            cache_writer.abort()
+        raise
+    return cache_writer.close() if cache_writer is not None else None
+
+
+def spool_cached_text(spool_path: str, text_path: str, batch_size: int):
+    """Parse-pool worker: cached cleaned text -> chunk batches in the spool file."""
+    _spool(text_chunk_batches(filing_text_cache.iter_text(text_path), batch_size), spool_path)
+
+
+class PooledBatches:
+    """
+    Chunk batches produced in the parse pool: `worker(spool_path, *args)` appends them to a
+    spool file (one JSON list per line) and iterating this object tails that file. The CPU
+    work runs on another core, while the pipeline's parse stage thread only reads, and the
+    first batches reach the embed stage while the filing is still being parsed.
+    """
+
+    def __init__(self, worker: Callable, *args):
+        fd, self.spool_path = tempfile.mkstemp(prefix="chunk-batches-", suffix=".jsonl")
+        os.close(fd)
+        self.future: Future = submit_to_parse_pool(worker, self.spool_path, *args)
+        self._batches = self._read()
+
+    def __iter__(self) -> Iterator[list[str]]:
+        return self._batches
+
+    def _read(self) -> Iterator[list[str]]:
+        with open(self.spool_path, encoding="utf-8") as spool:
+            pending = ""
+            finished = False
+            while True:
+                line = spool.readline()
+                if line.endswith("\n"):
+                    yield json.loads(pending + line)
+                    pending = ""
+                elif line:
+                    # The worker is mid-write; keep the partial line
+                    pending += line
+                elif finished:
+                    break
+                else:
+                    # Once the worker is done, one more pass picks up everything it wrote
+                    finished = bool(wait([self.future], timeout=SPOOL_POLL_SECONDS).done)
+        # Surfaces parse errors
+        self.future.result()
+
+    def close(self):
+        self._batches.close()
+        self.future.cancel()
+        if os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
+
+
+def parse_filing_batches(html_path: str, batch_size: int,
+                         cache_key: tuple[str, int, str, str] | None = None) -> PooledBatches:
+    """
+    Streaming parse of a downloaded filing in the parse pool. With `cache_key` (ticker, year,
+    accession, parser version) the cleaned text is published to the text cache as soon as the
+    parse succeeds, even if the pipeline consuming the batches stops early.
+    """
+    batches = PooledBatches(spool_filing, html_path, batch_size, cache_key)
+
+    def publish(future: Future):
+        if future.cancelled() or future.exception() is not None or future.result() is None:
+            return
+        filing_text_cache.publish(*cache_key, *future.result())
+
+    batches.future.add_done_callback(publish)
+    return batches
+
+
+def cached_text_batches(text_path: str, batch_size: int) -> PooledBatches:
+    """Chunking of a text-cache file in the parse pool."""
+    return PooledBatches(spool_cached_text, text_path, batch_size)
+
+
+async def _produce(batches: Iterator[list[str]], queue: asyncio.Queue, stop: threading.Event):
+    """Runs the blocking batch iterator in a thread, feeding the queue with backpressure."""
+    loop = asyncio.get_running_loop()
+
+    def run():
+        try:
+            for batch in batches:
+                asyncio.run_coroutine_threadsafe(queue.put(batch), loop).result()
+                if stop.is_set():
+                    break
+        finally:
+            # Closing here runs the iterator's cleanup (e.g. removing a spool file) in this thread
+            if hasattr(batches, "close"):
+                batches.close()
+            asyncio.run_coroutine_threadsafe(queue.put(_DONE), loop).result()
+
+    await asyncio.to_thread(run)
+
+
+async def run_pipeline(
+    batches: Iterator[list[str]],
+    embed: Callable[[list[str]], Awaitable[list]],
+    write: Callable[[int, list[str], list], Awaitable[int]],
+    depth: int = PIPELINE_DEPTH,
+    skip: int = 0,
+) -> tuple[int, int]:
+    """
+    parse -> embed -> write, as concurrent stages joined by bounded queues:
+      - parse: `batches` is iterated in a worker thread; for filings it is a PooledBatches,
+        so parsing itself runs in the parse pool and the thread only reads its output
+      - embed: each batch's embed request starts as soon as the batch is parsed, up to `depth` ahead
+      - write: batches are written in order via write(offset, chunks, embeddings) as their
+        embeddings arrive, so the first chunks are searchable while the rest are still parsing
+    The first `skip` chunks (already stored by an earlier run) are parsed but neither
+    embedded nor written. Returns (total reported by `write`, chunks in the filing).
+    """
+    parsed: asyncio.Queue = asyncio.Queue(maxsize=depth)
+    embedded: asyncio.Queue = asyncio.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    async def embed_stage():
+        offset = 0
+        while (batch := await parsed.get()) is not _DONE:
+            if offset < skip:
+                resume_at = min(skip - offset, len(batch))
+                batch = batch[resume_at:]
+                offset += resume_at
+                if not batch:
+                    continue
+            await embedded.put((offset, batch, asyncio.create_task(embed(batch))))
+            offset += len(batch)
+        await embedded.put(_DONE)
+        return offset
+
+    producer = asyncio.create_task(_produce(batches, parsed, stop))
+    embedder = asyncio.create_task(embed_stage())
+    written = 0
+    try:
+        while (item := await embedded.get()) is not _DONE:
+            offset, batch, embedding_task = item
+            written += await write(offset, batch, await embedding_task)
+        total_chunks = await embedder
+        # Surfaces parse errors (the parser still ends the stream cleanly when it fails)
+        await producer
+        return written, total_chunks
+    finally:
+        stop.set()
+        embedder.cancel()
+        while not embedded.empty():
+            item = embedded.get_nowait()
+            if item is not _DONE:
+                item[2].cancel()
+        # Unblock a parser thread waiting on a full queue so it can see `stop` and exit
+        while not producer.done():
+            while not parsed.empty():
+                parsed.get_nowait()
+            await asyncio.sleep(0.01)
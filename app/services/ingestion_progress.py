@@ -0,0 +1,165 @@
+from sqlalchemy import select, delete, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Filing, IngestionProgress
+from app.services.text_processing import PARSER_VERSION, CHUNKER_VERSION
+from app.services.vector_cache import filing_matrix_cache
+
+# Background chunks are stored at chunk_index = BACKGROUND_INDEX_OFFSET + position in the filing
+BACKGROUND_INDEX_OFFSET = 1000
+
+
+async def get_progress(db: AsyncSession, ticker: str, year: int) -> IngestionProgress | None:
+    return await db.get(IngestionProgress, (ticker, year), populate_existing=True)
+
+
+def is_current(progress: IngestionProgress) -> bool:
+    return progress.parser_version == PARSER_VERSION and progress.chunker_version == CHUNKER_VERSION
+
+
+def is_complete(progress: IngestionProgress | None) -> bool:
+    """The record says full ingestion finished under the current versions (rows not checked)."""
+    return progress is not None and progress.status == "complete" and is_current(progress)
+
+
+async def last_background_chunk(db: AsyncSession, ticker: str, year: int) -> int | None:
+    """Highest background chunk_index actually stored for the filing (None if there are none)."""
+    return (await db.execute(
+        select(func.max(Filing.chunk_index))
+        .where(Filing.ticker == ticker, Filing.year == year, Filing.chunk_index >= BACKGROUND_INDEX_OFFSET)
+    )).scalar()
+
+
+async def start(db: AsyncSession, ticker: str, year: int) -> int:
+    """
+    Opens (or resumes) a filing's progress record and returns the number of leading chunks
+    already committed. The checkpoint never resumes past the rows actually stored, so a filing
+    whose rows were deleted starts over. A record from another parser/chunker version is
+    reset and its background rows are deleted, since their chunk positions (and text) no
+    longer line up. Commits.
+    """
+    progress = await get_progress(db, ticker, year)
+    if progress is not None and is_current(progress):
+        stored = await last_background_chunk(db, ticker, year)
+        await db.commit()
+        if progress.last_chunk_index is None or stored is None:
+            return 0
+        return min(progress.last_chunk_index, stored) + 1 - BACKGROUND_INDEX_OFFSET
+
+    if progress is not None:
+        print(f"[Background] {ticker} {year} was indexed with parser {progress.parser_version} / chunker "
+              f"{progress.chunker_version}; deleting its background chunks to re-ingest.")
+        await db.execute(
+            delete(Filing)
+            .where(Filing.ticker == ticker, Filing.year == year, Filing.chunk_index >= BACKGROUND_INDEX_OFFSET)
+        )
+    values = dict(
+        status="in_progress", parser_version=PARSER_VERSION, chunker_version=CHUNKER_VERSION,
+        total_chunks=None, last_chunk_index=None, updated_at=func.now(), completed_at=None,
+    )
+    stmt = insert(IngestionProgress).values(ticker=ticker, year=year, **values)
+    await db.execute(stmt.on_conflict_do_update(index_elements=["ticker", "year"], set_=values))
+    await db.commit()
+    if progress is not None:
+        filing_matrix_cache.invalidate(ticker, year)
+    return 0
+
+
+async def clear_filing(db: AsyncSession, ticker: str, year: int):
+    """Deletes a filing's chunks together with its progress record, so it is re-ingested from scratch. Commits."""
+    await db.execute(delete(Filing).where(Filing.ticker == ticker, Filing.year == year))
+    await db.execute(delete(IngestionProgress).where(IngestionProgress.ticker == ticker, IngestionProgress.year == year))
+    await db.commit()
+    filing_matrix_cache.invalidate(ticker, year)
+
+
+async def checkpoint(db: AsyncSession, ticker: str, year: int, last_chunk_index: int):
+    """Records the highest committed chunk. Doesn't commit: call it in the chunks' transaction."""
+    stmt = (
+        insert(IngestionProgress)
+        .values(ticker=ticker, year=year, parser_version=PARSER_VERSION, chunker_version=CHUNKER_VERSION,
+                last_chunk_index=last_chunk_index)
+        .on_conflict_do_update(
+            index_elements=["ticker", "year"],
+            set_={"last_chunk_index": last_chunk_index, "updated_at": func.now()},
+        )
+    )
+    await db.execute(stmt)
+
+
+async def complete(db: AsyncSession, ticker: str, year: int, total_chunks: int):
+    stmt = (
+        insert(IngestionProgress)
+        .values(ticker=ticker, year=year, status="complete", parser_version=PARSER_VERSION,
+                chunker_version=CHUNKER_VERSION, total_chunks=total_chunks,
+                last_chunk_index=BACKGROUND_INDEX_OFFSET + total_chunks - 1, completed_at=func.now())
+        .on_conflict_do_update(
+            index_elements=["ticker", "year"],
+            set_={
+                "status": "complete",
+                "total_chunks": total_chunks,
+                "last_chunk_index": BACKGROUND_INDEX_OFFSET + total_chunks - 1,
+                "updated_at": func.now(),
+                "completed_at": func.now(),
+            },
+        )
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+async def restore(db: AsyncSession, ticker: str, year: int, status: str, parser_version: str,
+                  chunker_version: str, total_chunks: int | None, last_chunk_index: int | None):
+    """Writes a progress record as exported from another database (snapshot import). Doesn't commit."""
+    values = dict(
+        status=status, parser_version=parser_version, chunker_version=chunker_version,
+        total_chunks=total_chunks, last_chunk_index=last_chunk_index, updated_at=func.now(),
+        completed_at=func.now() if status == "complete" else None,
+    )
+    stmt = insert(IngestionProgress).values(ticker=ticker, year=year, **values)
+    await db.execute(stmt.on_conflict_do_update(index_elements=["ticker", "year"], set_=values))
+
+
+async def get_coverage(db: AsyncSession, pairs: list[tuple[str, int]]) -> dict[tuple[str, int], dict]:
+    """
+    How completely each (ticker, year) is indexed: "complete", "partial" (full ingestion
+    pending or in progress; only priority chunks and/or a prefix are searchable) or "missing".
+    """
+    if not pairs:
+        return {}
+    progress_rows = (await db.execute(
+        select(IngestionProgress).where(tuple_(IngestionProgress.ticker, IngestionProgress.year).in_(pairs))
+    )).scalars().all()
+    progress_by_key = {(p.ticker, p.year): p for p in progress_rows}
+
+    counts = {}
+    background_counts = {}
+    for ticker, year, n, background in (await db.execute(
+        select(
+            Filing.ticker, Filing.year, func.count(),
+            func.count().filter(Filing.chunk_index >= BACKGROUND_INDEX_OFFSET),
+        )
+        .where(tuple_(Filing.ticker, Filing.year).in_(pairs))
+        .group_by(Filing.ticker, Filing.year)
+    )).all():
+        counts[(ticker, year)] = n
+        background_counts[(ticker, year)] = background
+
+    coverage = {}
+    for key in pairs:
+        progress = progress_by_key.get(key)
+        chunks = counts.get(key, 0)
+        # A "complete" record only counts while its rows are still there (they may have been deleted)
+        if is_complete(progress) and background_counts.get(key, 0):
+            status = "complete"
+        elif chunks:
+            status = "partial"
+        else:
+            status = "missing"
+        coverage[key] = {
+            "status": status,
+            "chunks_stored": chunks,
+            "total_chunks": progress.total_chunks if progress is not None else None,
+            "last_chunk_index": progress.last_chunk_index if progress is not None else None,
+        }
+    return coverage
@@ -1,17 +1,44 @@
-import re
-import os
-import time
 import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models import Filing
 from app.services.sec_service import SECService
-from app.agents.utils import get_embedding
+from app.agents.utils import get_embeddings_batch, call_priority, PRIORITY_INGEST, BACKGROUND_INGEST
+from app.agents.embedding_cache import text_hash
+from app.services.vector_cache import filing_matrix_cache
+from app.services.chunk_writer import ChunkWriter, ChunkRecord
+from app.services import text_processing
+from app.services.text_processing import run_in_parse_pool, PARSER_VERSION
+from app.services.text_cache import filing_text_cache, accession_from_path
+from app.services.ingestion_pipeline import run_pipeline, parse_filing_batches, cached_text_batches
+from app.services import ingestion_progress
+
+# Chunks embedded (one batched embed request) and committed together during background ingestion
+BACKGROUND_BATCH_SIZE = 50
+# Stands in for the embedding of a chunk whose text is already stored for the filing
+ALREADY_STORED = object()
+
+class IngestionStats:
+    """Process-wide ingestion counters, for throughput reporting (see bulk_ingest.py)."""
+
+    def __init__(self):
+        self.chunks_written = 0
+        self.chunks_already_stored = 0
+
+    def stats(self) -> dict:
+        return {"chunks_written": self.chunks_written, "chunks_already_stored": self.chunks_already_stored}
+
+
+ingestion_stats = IngestionStats()
+
 
 class IngestionService:
     def __init__(self, db: AsyncSession):
         self.db = db
         self.sec_service = SECService()
+        # (ticker, year) -> task producing the cleaned text, so priority and background
+        # ingestion (and prefetching) parse each filing only once
+        self._texts: dict[tuple[str, int], asyncio.Task] = {}
 
     async def has_filing(self, ticker: str, year: int) -> bool:
         """Checks if we already have chunks for this ticker and year."""
@@ -19,62 +46,118 @@ class IngestionService:
         result = await self.db.execute(stmt)
         return result.first() is not None
 
-    async def _get_clean_text(self, ticker: str, year: int) -> str | None:
-        """Downloads and cleans text if not found in DB."""
+    async def _download_and_parse(self, ticker: str, year: int) -> str | None:
+        text = await asyncio.to_thread(filing_text_cache.get, ticker, year, PARSER_VERSION)
+        if text is not None:
+            print(f"Using cached text for {ticker} {year}.")
+            return text
+
         print(f"Downloading 10-K for {ticker} {year}...")
-        html_path = self.sec_service.download_10k(ticker, year)
+        html_path = await asyncio.to_thread(self.sec_service.download_10k, ticker, year)
         if not html_path:
             return None
-        
-        raw_text = self.sec_service.clean_text(html_path)
-        return self.advanced_clean(raw_text)
+
+        accession = accession_from_path(html_path)
+        text = await asyncio.to_thread(filing_text_cache.get_by_accession, accession, PARSER_VERSION)
+        if text is None:
+            text = await run_in_parse_pool(text_processing.parse_filing, html_path)
+        await asyncio.to_thread(filing_text_cache.put, ticker, year, accession, PARSER_VERSION, text)
+        return text
+
+    def prefetch(self, ticker: str, year: int) -> asyncio.Task:
+        """Starts downloading and parsing a filing without waiting for it."""
+        key = (ticker, year)
+        task = self._texts.get(key)
+        if task is None or (task.done() and (task.cancelled() or task.exception())):
+            task = asyncio.create_task(self._download_and_parse(ticker, year))
+            self._texts[key] = task
+        return task
+
+    async def _get_clean_text(self, ticker: str, year: int) -> str | None:
+        """Downloads and cleans text if not found in DB."""
+        return await self.prefetch(ticker, year)
 
     def _extract_priority_chunks(self, text: str) -> list[str]:
         """Extracts only keywords related to primary financial statements."""
-        priority_chunks = []
-        
-        # Regex for "Consolidated Statements of Operations" / "Income Statements"
-        # We capture the header and the following ~4000 chars (approx 1-2 pages)
-        patterns = [
-            r"(?i)(consolidated\s+statements?\s+of\s+(?:operations|income|earnings|comprehensive\s+income))",
-            r"(?i)(summary\s+of\s+financial\s+data)"
-        ]
-        
-        for pattern in patterns:
-            matches = re.finditer(pattern, text)
-            for match in matches:
-                start = match.start()
-                # Grab header + context. 
-                # 4000 characters is roughly 1-1.5 dense pages of text/tables
-                end = min(len(text), start + 4000) 
-                chunk = text[start:end].strip()
-                if chunk:
-                    priority_chunks.append(chunk)
-                    
-        return priority_chunks
-
-    async def _ingest_chunks(self, ticker: str, year: int, chunks: list[str], start_index: int = 0):
-        """Helper to embedding and save a list of chunks."""
-        for i, chunk in enumerate(chunks):
-            # Reduced delay for priority chunks to make it even faster
-            # For background chunks, we can keep the delay
-            if i > 0:
-                await asyncio.sleep(0.1) 
-            
-            embedding = await get_embedding(chunk)
-            filing = Filing(
-                ticker=ticker,
-                year=year,
-                chunk_index=start_index + i,
-                text_content=chunk,
-                embedding=embedding
-            )
-            self.db.add(filing)
-        
+        return text_processing.extract_priority_chunks(text)
+
+    async def _ingest_chunks(self, ticker: str, year: int, chunks: list[str], start_index: int = 0) -> int:
+        """Helper to embed (batched) and save a list of chunks. Returns the number of rows written."""
+        embeddings = await get_embeddings_batch(chunks)
+        return await self._write_chunks(ticker, year, chunks, embeddings, start_index)
+
+    async def _write_chunks(self, ticker: str, year: int, chunks: list[str], embeddings: list, start_index: int,
+                            checkpoint_index: int | None = None) -> int:
+        records = []
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+            if embedding is ALREADY_STORED:
+                ingestion_stats.chunks_already_stored += 1
+                continue
+            if embedding is None:
+                # Partial failure: keep the rest of the batch
+                print(f"Skipping chunk {start_index + i} for {ticker} {year}: no embedding.")
+                continue
+            records.append(ChunkRecord(ticker, year, start_index + i, chunk, embedding))
+
+        written = await ChunkWriter(self.db).write(records)
+        if checkpoint_index is not None:
+            # Same transaction as the chunks, so the checkpoint never runs ahead of the data
+            await ingestion_progress.checkpoint(self.db, ticker, year, checkpoint_index)
         await self.db.commit()
+        ingestion_stats.chunks_written += written
+        # Cached matrices for this filing are now stale
+        filing_matrix_cache.invalidate(ticker, year)
+        return written
+
+    async def _stored_hashes(self, ticker: str, year: int) -> set[str]:
+        rows = await self.db.execute(
+            select(Filing.content_hash).where(Filing.ticker == ticker, Filing.year == year)
+        )
+        return {h for (h,) in rows.all() if h}
+
+    async def _chunk_batches(self, ticker: str, year: int):
+        """
+        Returns an iterator of chunk batches for the filing from the cheapest source: text
+        already parsed by this service, the text cache, or a streaming parse of the download
+        (which fills the text cache). Chunking and parsing run in the parse pool. None if the
+        filing can't be found.
+        """
+        task = self._texts.get((ticker, year))
+        if task is not None and task.done() and not task.cancelled() and task.exception() is None:
+            text = task.result()
+            if not text:
+                return None
+            chunks = await run_in_parse_pool(text_processing.smart_chunk, text)
+            return iter([chunks[i:i + BACKGROUND_BATCH_SIZE] for i in range(0, len(chunks), BACKGROUND_BATCH_SIZE)])
+
+        cached_path = await asyncio.to_thread(filing_text_cache.find, ticker, year, PARSER_VERSION)
+        if cached_path:
+            return cached_text_batches(cached_path, BACKGROUND_BATCH_SIZE)
+
+        print(f"Downloading 10-K for {ticker} {year}...")
+        html_path = await asyncio.to_thread(self.sec_service.download_10k, ticker, year)
+        if not html_path:
+            return None
+
+        accession = accession_from_path(html_path)
+        cached_path = await asyncio.to_thread(filing_text_cache.find_by_accession, accession, PARSER_VERSION)
+        if cached_path:
+            return cached_text_batches(cached_path, BACKGROUND_BATCH_SIZE)
+
+        return parse_filing_batches(html_path, BACKGROUND_BATCH_SIZE, (ticker, year, accession, PARSER_VERSION))
+
+    async def ingest_text(self, ticker: str, year: int, text: str) -> list[str]:
+        """Cleans, chunks and ingests manually supplied text. Returns the chunks."""
+        chunks = await run_in_parse_pool(text_processing.clean_and_chunk, text)
+        await self._ingest_chunks(ticker, year, chunks, start_index=0)
+        return chunks
 
     async def ingest_priority(self, ticker: str, year: int) -> bool:
         """Fast-path: Ingest ONLY key financial statements."""
+        with call_priority(PRIORITY_INGEST):
+            return await self._ingest_priority(ticker, year)
+
+    async def _ingest_priority(self, ticker: str, year: int) -> bool:
         if await self.has_filing(ticker, year):
             return True
 
@@ -82,7 +165,7 @@ class IngestionService:
         if not text:
             return False
             
-        priority_chunks = self._extract_priority_chunks(text)
+        priority_chunks = await run_in_parse_pool(text_processing.extract_priority_chunks, text)
         if priority_chunks:
             print(f"[Priority] Ingesting {len(priority_chunks)} priority chunks for {ticker}...")
             await self._ingest_chunks(ticker, year, priority_chunks, start_index=0)
@@ -94,100 +177,87 @@ class IngestionService:
             # For now, let's treat it as 'done' for priority purposes so we don't block.
             return True
 
-    async def ingest_background(self, ticker: str, year: int):
-        """Slow-path: Ingest the rest of the document."""
-        # We check again if we need to download, but likely we just reuse the file if locally cached by download_10k logic
-        # Ideally, we pass the text, but for simplicity/statelessness we re-read.
-        # Check if we already have *full* coverage? 
-        # For this iteration, we will naive-ingest the whole thing. 
-        # Since we use append, this might create duplicates of the priority chunks in the DB 
-        # if we aren't careful.
-        # STRATEGY: We will ingest everything. The Priority Chunks are just "extra" copies 
-        # at the beginning of the index. This acts as a boost mechanism!
-        
-        # Check if we already have *full* coverage (indicated by high chunk indices)
-        # Priority chunks are < 1000. Background chunks are >= 1000.
-        stmt = select(Filing.id).where(
-            Filing.ticker == ticker, 
-            Filing.year == year,
-            Filing.chunk_index >= 1000
-        ).limit(1)
-        result = await self.db.execute(stmt)
-        if result.first(): 
-            print(f"[Background] Full ingestion likely complete for {ticker} {year} (found high-index chunks).")
-            return
+    async def ingest_background(self, ticker: str, year: int) -> bool:
+        """Slow-path: Ingest the rest of the document. Returns False if the filing couldn't be found."""
+        # Embedding calls yield the quota to interactive requests and priority ingestion
+        with call_priority(BACKGROUND_INGEST):
+            return await self._ingest_background(ticker, year)
 
-        print(f"[Background] Starting full ingestion for {ticker} {year}...")
-        text = await self._get_clean_text(ticker, year)
-        if not text:
-            return
-
-        chunks = self.smart_chunk(text)
-        print(f"[Background] Found {len(chunks)} total chunks. Ingesting...")
-        
-        # We use a larger delay for background to be nice to rate limits
-        for i, chunk in enumerate(chunks):
-            if i > 0:
-                await asyncio.sleep(2)
-            
-            embedding = await get_embedding(chunk)
-            filing = Filing(
-                # Use a high chunk index offset to avoid colliding with priority chunks 'conceptually'
-                # though physically they are just rows. 
-                # Actually, duplicate content is fine, it just increases recall.
-                ticker=ticker,
-                year=year,
-                chunk_index=1000 + i, # Offset to distinguish from priority
-                text_content=chunk,
-                embedding=embedding
+    async def _ingest_background(self, ticker: str, year: int) -> bool:
+        # Ingests every chunk of the filing. Priority chunks (larger statement excerpts) stay
+        # alongside as a boost; chunks whose text is already stored are skipped (content_hash).
+
+        # Resume from the last checkpoint. Priority chunks are < 1000; background chunks
+        # are stored at 1000 + their position in the filing.
+        progress = await ingestion_progress.get_progress(self.db, ticker, year)
+        if (ingestion_progress.is_complete(progress)
+                and await ingestion_progress.last_background_chunk(self.db, ticker, year) is not None):
+            print(f"[Background] Full ingestion already complete for {ticker} {year} ({progress.total_chunks} chunks).")
+            return True
+
+        resume_from = await ingestion_progress.start(self.db, ticker, year)
+        if resume_from:
+            print(f"[Background] Resuming full ingestion for {ticker} {year} after chunk {resume_from}...")
+        else:
+            print(f"[Background] Starting full ingestion for {ticker} {year}...")
+        batches = await self._chunk_batches(ticker, year)
+        if batches is None:
+            return False
+
+        # Chunks already stored (e.g. by a run from before checkpoints existed, or an
+        # interrupted one) are written as-is, never re-embedded
+        stored_hashes = await self._stored_hashes(ticker, year)
+
+        async def embed(chunks: list[str]) -> list:
+            hashes = [text_hash(chunk) for chunk in chunks]
+            missing = [chunk for chunk, h in zip(chunks, hashes) if h not in stored_hashes]
+            embeddings = iter(await get_embeddings_batch(missing) if missing else [])
+            return [ALREADY_STORED if h in stored_hashes else next(embeddings) for h in hashes]
+
+        # The checkpoint only covers a gap-free prefix: once a chunk fails to embed, later
+        # batches are still written but the checkpoint stops advancing, so a retry redoes the gap.
+        failed_chunks = 0
+
+        # Parsing, embedding and writing overlap: each batch is committed (and searchable)
+        # as soon as its embeddings arrive, while later batches are still being parsed.
+        async def write(offset: int, chunks: list[str], embeddings: list) -> int:
+            nonlocal failed_chunks
+            # Use a high chunk index offset to distinguish from priority chunks (< 1000).
+            start_index = ingestion_progress.BACKGROUND_INDEX_OFFSET + offset
+            checkpoint_index = None
+            if not failed_chunks:
+                first_missing = next((i for i, e in enumerate(embeddings) if e is None), len(chunks))
+                checkpoint_index = start_index + first_missing - 1
+            failed_chunks += sum(1 for e in embeddings if e is None)
+
+            written = await self._write_chunks(
+                ticker, year, chunks, embeddings, start_index=start_index, checkpoint_index=checkpoint_index
             )
-            self.db.add(filing)
-            
-            if (i + 1) % 10 == 0:
-                 # Commit internal batches to prevent massive transaction holding
-                await self.db.commit()
-                print(f"  [Background] Embedded {i + 1}/{len(chunks)}...")
-        
-        await self.db.commit()
-        print(f"[Background] Completed full ingestion for {ticker} {year}.")
+            print(f"  [Background] Embedded {offset + len(chunks)} chunks...")
+            return written
+
+        written, total_chunks = await run_pipeline(batches, embed, write, skip=resume_from)
+        if failed_chunks:
+            raise RuntimeError(f"{failed_chunks} chunks of {ticker} {year} could not be embedded; "
+                               f"ingestion will resume from the last checkpoint.")
+        await ingestion_progress.complete(self.db, ticker, year, total_chunks)
+        print(f"[Background] Completed full ingestion for {ticker} {year} ({written} new of {total_chunks} chunks).")
+        return True
 
     # Legacy wrapper for backward compatibility if needed, or simply remove
-    async def ingest_if_missing(self, ticker: str, year: int):
-        await self.ingest_priority(ticker, year)
-        await self.ingest_background(ticker, year)
+    async def ingest_if_missing(self, ticker: str, year: int) -> bool:
+        """Priority then full ingestion. Returns False if the filing couldn't be found."""
+        try:
+            await self.ingest_priority(ticker, year)
+            return await self.ingest_background(ticker, year)
+        finally:
+            # Don't hold on to the parsed text once the filing is done
+            self._texts.pop((ticker, year), None)
 
     def advanced_clean(self, text: str) -> str:
         """Removes XBRL/XML tags and excessive whitespace."""
-        # Remove XBRL tags like us-gaap:Revenue, msft:Income, etc.
-        text = re.sub(r'[a-z\-]+:[a-zA-Z0-9]+', '', text)
-        # Remove common SEC noise
-        text = re.sub(r'http://fasb\.org/[^\s]+', '', text)
-        text = re.sub(r'0000\d{6}', '', text) # Central Index Key noise
-        # Normalize whitespace
-        text = re.sub(r'\s+', ' ', text)
-        return text.strip()
+        return text_processing.advanced_clean(text)
 
     def smart_chunk(self, text: str, chunk_size: int = 1500, overlap: int = 200) -> list[str]:
         """Splits text into overlapping chunks for better retrieval coverage."""
-        chunks = []
-        if not text:
-            return chunks
-
-        start = 0
-        while start < len(text):
-            end = start + chunk_size
-            # Try to find a good breaking point (period + space)
-            if end < len(text):
-                last_period = text.rfind('. ', start, end)
-                if last_period != -1 and last_period > start + (chunk_size // 2):
-                    end = last_period + 1
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - overlap
-            if start < 0: start = 0
-            if end >= len(text): break
-            
-        return chunks
+        return text_processing.smart_chunk(text, chunk_size, overlap)
@@ -0,0 +1,256 @@
+import os
+import time
+import socket
+import asyncio
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal
+from app.models import IngestionJob
+
+# Workers started inside the API process (0 = run them only via ingest_worker.py)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# Retry n waits JOB_RETRY_BASE_SECONDS * 2^(n-1)
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "30"))
+# A running job's lease is renewed every third of this; if the worker dies, the job is
+# reclaimed once the lease runs out
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+
+CLAIM_SQL = text("""
+    UPDATE ingestion_jobs
+    SET status = 'running',
+        attempts = attempts + 1,
+        locked_by = :worker_id,
+        locked_until = now() + make_interval(secs => :lease),
+        updated_at = now()
+    WHERE id = (
+        SELECT id FROM ingestion_jobs
+        WHERE (status = 'queued' AND run_after <= now())
+           OR (status = 'running' AND locked_until < now() AND attempts < max_attempts)
+        ORDER BY run_after, id
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, ticker, year, attempts, max_attempts
+""")
+
+# Claims one specific job, if it isn't running under a live lease
+CLAIM_JOB_SQL = text("""
+    UPDATE ingestion_jobs
+    SET status = 'running',
+        attempts = attempts + 1,
+        locked_by = :worker_id,
+        locked_until = now() + make_interval(secs => :lease),
+        updated_at = now()
+    WHERE id = :id
+      AND (status = 'queued' OR (status = 'running' AND locked_until < now() AND attempts < max_attempts))
+    RETURNING id, ticker, year, attempts, max_attempts
+""")
+
+# A job whose lease ran out on its last attempt crashed its worker every time (e.g. OOM while
+# parsing), so _finish never ran; fail it rather than reclaiming it forever
+FAIL_EXHAUSTED_SQL = text("""
+    UPDATE ingestion_jobs
+    SET status = 'failed', locked_by = NULL, locked_until = NULL,
+        last_error = 'Lease expired on the final attempt (worker stopped without finishing the job)',
+        finished_at = now(), updated_at = now()
+    WHERE status = 'running' AND locked_until < now() AND attempts >= max_attempts
+""")
+
+
+class LeaseLost(Exception):
+    """A worker's lease on its job lapsed or was taken over; the job is no longer its to finish."""
+
+
+async def enqueue_ingestion(db: AsyncSession, ticker: str, year: int) -> int:
+    """
+    Queues background ingestion of a filing and returns the job id. If the filing already
+    has a queued or running job, that job's id is returned instead (single flight). Callers
+    enqueue filings whose coverage isn't complete; a finished job never blocks a new one.
+    """
+    stmt = (
+        insert(IngestionJob)
+        .values(ticker=ticker, year=year, status="queued", max_attempts=JOB_MAX_ATTEMPTS)
+        .on_conflict_do_nothing(
+            index_elements=["ticker", "year"],
+            index_where=text("status IN ('queued', 'running')"),
+        )
+        .returning(IngestionJob.id)
+    )
+    job_id = (await db.execute(stmt)).scalar()
+    if job_id is None:
+        job_id = (await db.execute(
+            select(IngestionJob.id)
+            .where(IngestionJob.ticker == ticker, IngestionJob.year == year,
+                   IngestionJob.status.in_(["queued", "running"]))
+        )).scalar()
+    await db.commit()
+    return job_id
+
+
+async def get_jobs(db: AsyncSession, ticker: str | None = None, year: int | None = None, limit: int = 50,
+                   job_id: int | None = None) -> list[dict]:
+    stmt = select(IngestionJob).order_by(IngestionJob.id.desc()).limit(limit)
+    if job_id is not None:
+        stmt = stmt.where(IngestionJob.id == job_id)
+    if ticker:
+        stmt = stmt.where(IngestionJob.ticker == ticker)
+    if year:
+        stmt = stmt.where(IngestionJob.year == year)
+    jobs = (await db.execute(stmt)).scalars().all()
+    return [
+        {
+            "id": job.id,
+            "ticker": job.ticker,
+            "year": job.year,
+            "status": job.status,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "run_after": job.run_after,
+            "locked_by": job.locked_by,
+            "last_error": job.last_error,
+            "created_at": job.created_at,
+            "updated_at": job.updated_at,
+            "finished_at": job.finished_at,
+        }
+        for job in jobs
+    ]
+
+
+class IngestionWorker:
+    """
+    Claims ingestion jobs and runs them. Any number of workers can run, in the API process
+    (INGEST_WORKERS) or in separate processes/nodes (ingest_worker.py); SKIP LOCKED ensures
+    each job is claimed by exactly one of them.
+    """
+
+    def __init__(self, name: str | None = None, poll_interval: float = JOB_POLL_INTERVAL):
+        self.worker_id = name or f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self.poll_interval = poll_interval
+
+    async def claim(self):
+        async with AsyncSessionLocal() as db:
+            await db.execute(FAIL_EXHAUSTED_SQL)
+            job = (await db.execute(CLAIM_SQL, {"worker_id": self.worker_id, "lease": JOB_LEASE_SECONDS})).first()
+            await db.commit()
+            return job
+
+    async def claim_job(self, job_id: int):
+        """Claims the given job (ignoring run_after), or returns None if another worker holds it."""
+        async with AsyncSessionLocal() as db:
+            await db.execute(FAIL_EXHAUSTED_SQL)
+            job = (await db.execute(
+                CLAIM_JOB_SQL, {"id": job_id, "worker_id": self.worker_id, "lease": JOB_LEASE_SECONDS}
+            )).first()
+            await db.commit()
+            return job
+
+    async def _renew_lease(self, job_id: int):
+        """
+        Extends the job's lease every third of JOB_LEASE_SECONDS. Raises LeaseLost once another
+        worker owns the job or renewal has failed for a whole lease, so the caller stops working
+        on a job that may already be running elsewhere.
+        """
+        renewed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(text("""
+                        UPDATE ingestion_jobs SET locked_until = now() + make_interval(secs => :lease)
+                        WHERE id = :id AND locked_by = :worker_id AND status = 'running'
+                    """), {"id": job_id, "worker_id": self.worker_id, "lease": JOB_LEASE_SECONDS})
+                    await db.commit()
+            except Exception as e:
+                print(f"[Worker {self.worker_id}] Job {job_id}: error renewing lease: {e}")
+                if time.monotonic() - renewed_at >= JOB_LEASE_SECONDS:
+                    raise LeaseLost(f"lease could not be renewed for {JOB_LEASE_SECONDS:.0f}s") from e
+                continue
+            if result.rowcount == 0:
+                raise LeaseLost("job was reclaimed by another worker")
+            renewed_at = time.monotonic()
+
+    async def _finish(self, job, error: str | None):
+        # Guarded by locked_by: if our lease lapsed and another worker reclaimed the job, it owns the outcome
+        async with AsyncSessionLocal() as db:
+            if error is None:
+                await db.execute(text("""
+                    UPDATE ingestion_jobs
+                    SET status = 'succeeded', locked_by = NULL, locked_until = NULL,
+                        last_error = NULL, finished_at = now(), updated_at = now()
+                    WHERE id = :id AND locked_by = :worker_id
+                """), {"id": job.id, "worker_id": self.worker_id})
+            elif job.attempts < job.max_attempts:
+                delay = JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+                await db.execute(text("""
+                    UPDATE ingestion_jobs
+                    SET status = 'queued', locked_by = NULL, locked_until = NULL, last_error = :error,
+                        run_after = now() + make_interval(secs => :delay), updated_at = now()
+                    WHERE id = :id AND locked_by = :worker_id
+                """), {"id": job.id, "worker_id": self.worker_id, "error": error, "delay": delay})
+            else:
+                await db.execute(text("""
+                    UPDATE ingestion_jobs
+                    SET status = 'failed', locked_by = NULL, locked_until = NULL, last_error = :error,
+                        finished_at = now(), updated_at = now()
+                    WHERE id = :id AND locked_by = :worker_id
+                """), {"id": job.id, "worker_id": self.worker_id, "error": error})
+            await db.commit()
+
+    async def process(self, job) -> str | None:
+        """Runs a claimed job and records its outcome. Returns the error, or None on success."""
+        from app.services.ingestion_service import IngestionService
+
+        print(f"[Worker {self.worker_id}] Job {job.id}: {job.ticker} {job.year} (attempt {job.attempts}/{job.max_attempts})")
+
+        async def ingest():
+            async with AsyncSessionLocal() as db:
+                return await IngestionService(db).ingest_background(job.ticker, job.year)
+
+        work = asyncio.create_task(ingest())
+        lease = asyncio.create_task(self._renew_lease(job.id))
+        await asyncio.wait({work, lease}, return_when=asyncio.FIRST_COMPLETED)
+        if not work.done():
+            # Lease lost: the job may already be running on another worker, which now owns its outcome
+            work.cancel()
+            await asyncio.gather(work, return_exceptions=True)
+            print(f"[Worker {self.worker_id}] Job {job.id} abandoned: {lease.exception()}")
+            return f"Lease lost: {lease.exception()}"
+        lease.cancel()
+
+        error = None
+        try:
+            if not work.result():
+                error = f"No 10-K found for {job.ticker} {job.year}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        if error:
+            print(f"[Worker {self.worker_id}] Job {job.id} failed: {error}")
+        await self._finish(job, error)
+        return error
+
+    async def run(self):
+        print(f"[Worker {self.worker_id}] Started.")
+        while True:
+            try:
+                job = await self.claim()
+            except Exception as e:
+                print(f"[Worker {self.worker_id}] Error claiming job: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self.process(job)
+            except Exception as e:
+                # e.g. the database was unreachable when recording the outcome; the job's lease
+                # runs out and it is reclaimed, so keep the worker alive
+                print(f"[Worker {self.worker_id}] Error processing job {job.id}: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+
+async def run_workers(count: int = INGEST_WORKERS):
+    await asyncio.gather(*(IngestionWorker().run() for _ in range(count)))
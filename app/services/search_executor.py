@@ -0,0 +1,38 @@
+import os
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+from app.database import AsyncSessionLocal, DB_POOL_SIZE
+from app.agents.search import SearchAgent, SearchHit
+
+T = TypeVar("T")
+
+# AsyncSession doesn't support concurrent use, so parallel searches each get their own
+# session (and pooled connection). These caps keep one request from draining the pool
+# and keep the whole process within it.
+SEARCH_MAX_CONCURRENCY = int(os.getenv("SEARCH_MAX_CONCURRENCY", str(DB_POOL_SIZE)))
+SEARCH_MAX_CONCURRENCY_PER_REQUEST = int(os.getenv("SEARCH_MAX_CONCURRENCY_PER_REQUEST", "4"))
+
+_global_slots = asyncio.Semaphore(SEARCH_MAX_CONCURRENCY)
+
+
+class SearchExecutor:
+    """
+    Runs search tasks in parallel, each on its own session checked out from the engine pool.
+    Create one per request; concurrency is capped per executor and process-wide.
+    """
+
+    def __init__(self, max_concurrency: int = SEARCH_MAX_CONCURRENCY_PER_REQUEST):
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def run(self, task: Callable[[SearchAgent], Awaitable[T]]) -> T:
+        # Take the per-request slot first so a queued request doesn't hold a global slot
+        async with self._slots:
+            async with _global_slots:
+                async with AsyncSessionLocal() as db:
+                    return await task(SearchAgent(db))
+
+    async def search_batch(self, queries: list[str], ticker: str, year: int, **kwargs) -> list[list[SearchHit]]:
+        return await self.run(lambda agent: agent.search_batch(queries, ticker, year, **kwargs))
+
+    async def search(self, query: str, ticker: str, year: int, **kwargs) -> list[SearchHit]:
+        return await self.run(lambda agent: agent.search(query, ticker, year, **kwargs))
@@ -1,9 +1,14 @@
 import os
 import glob
 import re
+import codecs
+from typing import Iterator
 from sec_edgar_downloader import Downloader
+from app.services.html_text import PARSER_BACKEND, get_text_extractor
+from app.services.filing_manifest import get_manifest
 
-from bs4 import BeautifulSoup
+# Bytes read per step when streaming filings from disk
+READ_SIZE = 1 << 20
 
 class SECService:
     def __init__(self, download_dir: str = "sec_downloads"):
@@ -12,25 +17,41 @@ class SECService:
         # SEC requires Company Name and Email separately for v5
         self.company = os.getenv("SEC_COMPANY", "SEC Agent RAG")
         self.email = os.getenv("SEC_EMAIL", "admin@secagentrag.com")
-        self.dl = Downloader(self.company, self.email, self.download_dir)
+        self._dl = None
+        self.manifest = get_manifest(os.path.join(self.download_dir, "manifest.sqlite3"))
+
+    @property
+    def dl(self) -> Downloader:
+        # Created on first use: the Downloader fetches EDGAR's ticker -> CIK map when constructed
+        if self._dl is None:
+            self._dl = Downloader(self.company, self.email, self.download_dir)
+        return self._dl
 
     def download_10k(self, ticker: str, year: int) -> str | None:
         """
         Downloads 10-K filings and returns the specific one matching the requested fiscal year.
+        Filings already on disk are served from the manifest without touching the network.
         """
+        file_path = self.manifest.lookup(ticker, "10-K", year)
+        if file_path:
+            print(f"Found {ticker} {year} 10-K in manifest: {file_path}")
+            return file_path
+
+        # Files downloaded before the manifest existed
+        file_path = self._index_local_filings(ticker, "10-K", year)
+        if file_path:
+            print(f"Found matching local filing for {year}: {file_path}")
+            return file_path
+
         try:
             print(f"Downloading 10-K for {ticker}...")
             # Download a few to ensure we get the right one
             self.dl.get("10-K", ticker, limit=5)
-            
-            search_pattern = os.path.join(self.download_dir, "sec-edgar-filings", ticker, "10-K", "*", "*.txt")
-            files = glob.glob(search_pattern)
-            
-            for file_path in files:
-                metadata = self.get_filing_metadata(file_path)
-                if metadata.get("fiscal_year") == year:
-                    print(f"Found matching filing for {year}: {file_path}")
-                    return file_path
+
+            file_path = self._index_local_filings(ticker, "10-K", year)
+            if file_path:
+                print(f"Found matching filing for {year}: {file_path}")
+                return file_path
             
             print(f"No filing found with CONFORMED PERIOD OF REPORT matching {year}.")
             return None
@@ -39,6 +60,21 @@ class SECService:
             print(f"Error downloading 10-K: {e}")
             return None
 
+    def _index_local_filings(self, ticker: str, form: str, year: int) -> str | None:
+        """
+        Records downloaded filings that aren't in the manifest yet (one header parse per new
+        file), then returns the path for the requested fiscal year, if any.
+        """
+        known = self.manifest.known_paths(ticker, form)
+        search_pattern = os.path.join(self.download_dir, "sec-edgar-filings", ticker, form, "*", "*.txt")
+        for file_path in glob.glob(search_pattern):
+            if file_path in known:
+                continue
+            metadata = self.get_filing_metadata(file_path)
+            accession = metadata.get("accession") or os.path.basename(os.path.dirname(file_path))
+            self.manifest.record(ticker, form, metadata.get("fiscal_year"), accession, file_path)
+        return self.manifest.lookup(ticker, form, year)
+
     def get_filing_metadata(self, file_path: str) -> dict:
         """
         Parses the SEC SGML header to extract metadata.
@@ -54,6 +90,11 @@ class SECService:
                 if period_match:
                     metadata["fiscal_year"] = int(period_match.group(1))
                 
+                # Extract ACCESSION NUMBER: 0000320193-23-000106
+                accession_match = re.search(r'ACCESSION NUMBER:\s+([\d-]+)', header_text)
+                if accession_match:
+                    metadata["accession"] = accession_match.group(1)
+
                 # Extract FORM TYPE
                 type_match = re.search(r'CONFORMED SUBMISSION TYPE:\s+(.*)', header_text)
                 if type_match:
@@ -64,68 +105,126 @@ class SECService:
         return metadata
 
 
-    def clean_text(self, html_path: str) -> str:
+    def clean_text(self, html_path: str, backend: str = PARSER_BACKEND) -> str:
         """
         Parses the HTML and returns clean text.
         """
-        if not os.path.exists(html_path):
-            raise FileNotFoundError(f"File not found: {html_path}")
+        return clean_text(html_path, backend)
 
-        with open(html_path, "r", encoding="utf-8") as f:
-            content = f.read()
+    def iter_text_blocks(self, html_path: str, backend: str = PARSER_BACKEND) -> Iterator[str]:
+        return iter_text_blocks(html_path, backend)
 
-        # Handle SGML full-submission.txt
-        if "full-submission.txt" in html_path:
-            content = self._extract_10k_html(content)
-            
-        soup = BeautifulSoup(content, "html.parser")
-        
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.extract()
 
-        # Get text
-        text = soup.get_text(separator="\n\n")
+# Text extraction needs no Downloader (whose constructor calls EDGAR), so it's also
+# available as plain functions for parse-pool workers and scripts.
 
-        # Break into lines and remove leading and trailing space on each
-        lines = (line.strip() for line in text.splitlines())
-        # Break multi-headlines into a line each
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        # Drop blank lines
-        text = '\n'.join(chunk for chunk in chunks if chunk)
+def clean_text(html_path: str, backend: str = PARSER_BACKEND) -> str:
+    """Parses the HTML and returns clean text."""
+    return '\n'.join(iter_text_blocks(html_path, backend))
 
-        return text
 
-    def _extract_10k_html(self, sgml_content: str) -> str:
-        """
-        Extracts the HTML content of the 10-K document from the SGML dump.
-        """
-        # Simple string search - in production use a regex or iterator for memory efficiency
-        # We look for <TYPE>10-K ... <TEXT> ... </TEXT>
-        # Note: Sometimes it's <TYPE>10-K/A
-        
-        import re
-        # Find the start of the 10-K document
-        # <DOCUMENT> -> <TYPE>10-K -> ... <TEXT>
-        
-        doc_start_pattern = re.compile(r'<DOCUMENT>')
-        doc_end_pattern = re.compile(r'</DOCUMENT>')
-        
-        type_pattern = re.compile(r'<TYPE>10-K')
-        
-        # Split by document seems safer but memory intensive. 
-        # Let's simple split by <DOCUMENT>
-        documents = sgml_content.split('<DOCUMENT>')
-        
-        for doc in documents:
-            if "<TYPE>10-K" in doc or "<TYPE>10-K/A" in doc:
-                # Extract text between <TEXT> and </TEXT>
-                start = doc.find('<TEXT>')
-                end = doc.find('</TEXT>')
-                if start != -1 and end != -1:
-                    return doc[start+6:end]
-                    
-        # Fallback: just return the whole thing if we can't find specific 10-K section, 
-        # but warn or maybe return first large chunk
-        return sgml_content
+def iter_text_blocks(html_path: str, backend: str = PARSER_BACKEND) -> Iterator[str]:
+    """
+    Streams clean text blocks (one per HTML text node, blank lines dropped) from a filing.
+    Memory stays bounded by the read size regardless of submission size: the file is read
+    incrementally and fed to an incremental HTML tokenizer (except for the "bs4" backend).
+    """
+    if not os.path.exists(html_path):
+        raise FileNotFoundError(f"File not found: {html_path}")
+
+    # Handle SGML full-submission.txt
+    if "full-submission.txt" in html_path:
+        html_pieces = _iter_10k_html(html_path)
+    else:
+        html_pieces = _iter_file(html_path)
+
+    parser = get_text_extractor(backend)
+    for piece in html_pieces:
+        parser.feed(piece)
+        yield from parser.drain()
+    parser.close()
+    yield from parser.drain()
+
+
+def _iter_10k_html(path: str, read_size: int = READ_SIZE) -> Iterator[str]:
+    """
+    Yields the HTML of the 10-K document from the SGML dump in pieces.
+    Scans <DOCUMENT> -> <TYPE>10-K (or 10-K/A) -> <TEXT> ... </TEXT> and stops at the
+    first match. Other documents (exhibits, base64 images, XBRL) are skipped without
+    ever being held in memory.
+    """
+    state = "seek_document"
+    buffer = ""
+    found = False
+
+    for data in _iter_file(path, read_size):
+        buffer += data
+        while True:
+            if state == "seek_document":
+                pos = buffer.find("<DOCUMENT>")
+                if pos == -1:
+                    buffer = buffer[-len("<DOCUMENT>"):]
+                    break
+                buffer = buffer[pos + len("<DOCUMENT>"):]
+                state = "read_type"
+
+            elif state == "read_type":
+                pos = buffer.find("<TYPE>")
+                if pos == -1 or buffer.find("\n", pos) == -1:
+                    break  # need more data to see the whole <TYPE> line
+                line_end = buffer.find("\n", pos)
+                doc_type = buffer[pos + len("<TYPE>"):line_end].strip()
+                buffer = buffer[line_end:]
+                state = "seek_text" if doc_type.startswith("10-K") else "skip_document"
+
+            elif state == "skip_document":
+                pos = buffer.find("</DOCUMENT>")
+                if pos == -1:
+                    buffer = buffer[-len("</DOCUMENT>"):]
+                    break
+                buffer = buffer[pos + len("</DOCUMENT>"):]
+                state = "seek_document"
+
+            elif state == "seek_text":
+                pos = buffer.find("<TEXT>")
+                if pos == -1:
+                    buffer = buffer[-len("<TEXT>"):]
+                    break
+                buffer = buffer[pos + len("<TEXT>"):]
+                state = "in_text"
+                found = True
+
+            elif state == "in_text":
+                pos = buffer.find("</TEXT>")
+                if pos != -1:
+                    if pos:
+                        yield buffer[:pos]
+                    return
+                # Hold back a possible partial "</TEXT>" at the end of the buffer
+                keep = len("</TEXT>") - 1
+                if len(buffer) > keep:
+                    yield buffer[:-keep]
+                    buffer = buffer[-keep:]
+                break
+
+    if state == "in_text" and buffer:
+        yield buffer  # unterminated <TEXT>
+    elif not found:
+        # Fallback: just return the whole thing if we can't find a specific 10-K section
+        yield from _iter_file(path, read_size)
+
 
+def _iter_file(path: str, read_size: int = READ_SIZE) -> Iterator[str]:
+    """Reads a file as text in fixed-size pieces (multi-byte characters are never split)."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(read_size)
+            if not data:
+                break
+            text = decoder.decode(data)
+            if text:
+                yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
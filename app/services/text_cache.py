@@ -0,0 +1,186 @@
+import os
+import gzip
+import sqlite3
+import threading
+
+# Cleaned filing text, gzip-compressed, one file per (accession, parser version).
+# Set to an empty string to disable the cache.
+FILING_TEXT_CACHE_DIR = os.getenv("FILING_TEXT_CACHE_DIR", ".cache/filing_text")
+
+
+def accession_from_path(html_path: str) -> str:
+    """sec-edgar-filings/<ticker>/10-K/<accession>/full-submission.txt -> <accession>"""
+    return os.path.basename(os.path.dirname(os.path.abspath(html_path)))
+
+
+class FilingTextCache:
+    """
+    On-disk cache of cleaned 10-K text, keyed by accession number and parser version so a
+    parser change never serves stale text. A SQLite index maps (ticker, year) to the cached
+    file, so a hit needs neither EDGAR nor the raw filing: one index lookup, one file read.
+    """
+
+    def __init__(self, directory: str | None = FILING_TEXT_CACHE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS filing_text (
+                    ticker TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    parser_version TEXT NOT NULL,
+                    accession TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    chars INTEGER NOT NULL,
+                    PRIMARY KEY (ticker, year, parser_version)
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_filing_text_accession ON filing_text (accession, parser_version)"
+            )
+            self._conn.commit()
+
+    def _read(self, path: str) -> str | None:
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return f.read()
+        except (OSError, EOFError):
+            # Missing or truncated file; drop it and treat as a miss so the caller re-parses
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+
+    def _find(self, where: str, params: tuple) -> str | None:
+        if self._conn is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(f"SELECT path FROM filing_text WHERE {where} LIMIT 1", params).fetchone()
+        if row and os.path.exists(row[0]):
+            self.hits += 1
+            return row[0]
+        self.misses += 1
+        return None
+
+    def _lookup(self, where: str, params: tuple) -> str | None:
+        path = self._find(where, params)
+        return self._read(path) if path else None
+
+    def get(self, ticker: str, year: int, parser_version: str) -> str | None:
+        return self._lookup("ticker = ? AND year = ? AND parser_version = ?", (ticker, year, parser_version))
+
+    def get_by_accession(self, accession: str, parser_version: str) -> str | None:
+        return self._lookup("accession = ? AND parser_version = ?", (accession, parser_version))
+
+    def find(self, ticker: str, year: int, parser_version: str) -> str | None:
+        """Like get(), but returns the cached file's path for streaming with iter_text()."""
+        return self._find("ticker = ? AND year = ? AND parser_version = ?", (ticker, year, parser_version))
+
+    def find_by_accession(self, accession: str, parser_version: str) -> str | None:
+        return self._find("accession = ? AND parser_version = ?", (accession, parser_version))
+
+    def iter_text(self, path: str, read_size: int = 1 << 20):
+        """Yields a cached file's text in pieces, so streaming readers never hold all of it."""
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            while True:
+                piece = f.read(read_size)
+                if not piece:
+                    break
+                yield piece
+
+    def _path(self, accession: str, parser_version: str) -> str:
+        return os.path.join(self.directory, f"{accession}-v{parser_version}.txt.gz")
+
+    def put(self, ticker: str, year: int, accession: str, parser_version: str, text: str):
+        if self._conn is None:
+            return
+        path = self._path(accession, parser_version)
+        # Content is determined by (accession, version), so an existing file is reused as is
+        if not os.path.exists(path):
+            writer = self.writer(ticker, year, accession, parser_version)
+            writer.write(text)
+            writer.commit()
+        else:
+            self._index(ticker, year, accession, parser_version, path, len(text))
+
+    def writer(self, ticker: str, year: int, accession: str, parser_version: str) -> "FilingTextWriter":
+        """Streams text into the cache; nothing is visible to readers until commit()."""
+        return FilingTextWriter(self, ticker, year, accession, parser_version)
+
+    def publish(self, ticker: str, year: int, accession: str, parser_version: str, tmp_path: str, chars: int):
+        """Moves a completely written temp file (see FilingTextWriter.close) into place and indexes it."""
+        path = self._path(accession, parser_version)
+        os.replace(tmp_path, path)
+        self._index(ticker, year, accession, parser_version, path, chars)
+
+    def _index(self, ticker: str, year: int, accession: str, parser_version: str, path: str, chars: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO filing_text (ticker, year, parser_version, accession, path, chars) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (ticker, year, parser_version, accession, path, chars)
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        files = 0
+        if self._conn is not None:
+            with self._lock:
+                files = self._conn.execute("SELECT COUNT(*) FROM filing_text").fetchone()[0]
+        return {
+            "files": files,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class FilingTextWriter:
+    """Incremental writer for one cache entry. Write-then-rename, so readers never see a partial file."""
+
+    def __init__(self, cache: FilingTextCache, ticker: str, year: int, accession: str, parser_version: str):
+        self.cache = cache
+        self.key = (ticker, year, accession, parser_version)
+        self.chars = 0
+        self._file = None
+        if cache._conn is not None:
+            self.path = cache._path(accession, parser_version)
+            self._tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            self._file = gzip.open(self._tmp_path, "wt", encoding="utf-8", compresslevel=6)
+
+    def write(self, text: str):
+        if self._file is not None:
+            self._file.write(text)
+            self.chars += len(text)
+
+    def close(self) -> tuple[str, int] | None:
+        """
+        Finishes the temp file without publishing it and returns (temp path, chars) for
+        FilingTextCache.publish(). Lets a parse-pool worker write the text while the parent
+        process, which owns the SQLite index, publishes it.
+        """
+        if self._file is None:
+            return None
+        self._file.close()
+        self._file = None
+        return self._tmp_path, self.chars
+
+    def commit(self):
+        closed = self.close()
+        if closed is not None:
+            self.cache.publish(*self.key, *closed)
+
+    def abort(self):
+        closed = self.close()
+        if closed is not None:
+            os.remove(closed[0])
+
+
+filing_text_cache = FilingTextCache()
@@ -0,0 +1,208 @@
+import os
+import re
+import asyncio
+import functools
+from concurrent.futures import Future, ProcessPoolExecutor
+from app.services.sec_service import clean_text
+from app.services.html_text import PARSER_BACKEND
+
+# Parsing, cleaning and chunking a 10-K is pure CPU work (seconds per filing). It runs in a
+# process pool so it neither blocks the event loop nor serializes on the GIL.
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Version of the parse_filing output (HTML-to-text + advanced_clean). Bump it whenever that
+# output changes so cached cleaned text is re-parsed. Backends can disagree on malformed markup,
+# so the active backend is part of the version.
+PARSER_VERSION = f"2-{PARSER_BACKEND}"
+# Version of smart_chunk / IncrementalChunker boundaries (chunk_size=1500, overlap=200)
+CHUNKER_VERSION = "1"
+
+XBRL_TAG_PATTERN = re.compile(r'[a-z\-]+:[a-zA-Z0-9]+')
+FASB_URL_PATTERN = re.compile(r'http://fasb\.org/[^\s]+')
+CIK_PATTERN = re.compile(r'0000\d{6}')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+PRIORITY_PATTERNS = [
+    # "Consolidated Statements of Operations" / "Income Statements"
+    re.compile(r"(?i)(consolidated\s+statements?\s+of\s+(?:operations|income|earnings|comprehensive\s+income))"),
+    re.compile(r"(?i)(summary\s+of\s+financial\s+data)"),
+]
+
+
+def advanced_clean(text: str) -> str:
+    """Removes XBRL/XML tags and excessive whitespace."""
+    # Remove XBRL tags like us-gaap:Revenue, msft:Income, etc.
+    text = XBRL_TAG_PATTERN.sub('', text)
+    # Remove common SEC noise
+    text = FASB_URL_PATTERN.sub('', text)
+    text = CIK_PATTERN.sub('', text) # Central Index Key noise
+    # Normalize whitespace
+    text = WHITESPACE_PATTERN.sub(' ', text)
+    return text.strip()
+
+
+def smart_chunk(text: str, chunk_size: int = 1500, overlap: int = 200) -> list[str]:
+    """Splits text into overlapping chunks for better retrieval coverage."""
+    chunks = []
+    if not text:
+        return chunks
+
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        # Try to find a good breaking point (period + space)
+        if end < len(text):
+            last_period = text.rfind('. ', start, end)
+            if last_period != -1 and last_period > start + (chunk_size // 2):
+                end = last_period + 1
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        start = end - overlap
+        if start < 0: start = 0
+        if end >= len(text): break
+
+    return chunks
+
+
+def extract_priority_chunks(text: str) -> list[str]:
+    """Extracts only keywords related to primary financial statements."""
+    priority_chunks = []
+
+    for pattern in PRIORITY_PATTERNS:
+        for match in pattern.finditer(text):
+            start = match.start()
+            # Grab header + context.
+            # 4000 characters is roughly 1-1.5 dense pages of text/tables
+            end = min(len(text), start + 4000)
+            chunk = text[start:end].strip()
+            if chunk:
+                priority_chunks.append(chunk)
+
+    return priority_chunks
+
+
+class IncrementalCleaner:
+    """
+    Streaming advanced_clean over text blocks. None of the removal patterns can match
+    whitespace, so cleaning each block separately and collapsing whitespace across the
+    boundaries gives exactly advanced_clean('\n'.join(blocks)).
+    """
+
+    def __init__(self):
+        self._fed = False
+        self._started = False
+        self._need_space = False
+
+    def feed(self, block: str) -> str:
+        """Returns the cleaned text this block contributes to the output."""
+        pieces = []
+        for piece in (self._separator(), self._remove_noise(block)):
+            if not piece:
+                continue
+            core = piece.strip()
+            if not core:
+                self._need_space = True
+                continue
+            if self._started and (self._need_space or piece[0].isspace()):
+                pieces.append(' ')
+            pieces.append(WHITESPACE_PATTERN.sub(' ', core))
+            self._started = True
+            self._need_space = piece[-1].isspace()
+        return ''.join(pieces)
+
+    def _separator(self) -> str:
+        # Blocks are joined by newlines, like clean_text does
+        separator = '\n' if self._fed else ''
+        self._fed = True
+        return separator
+
+    @staticmethod
+    def _remove_noise(text: str) -> str:
+        text = XBRL_TAG_PATTERN.sub('', text)
+        text = FASB_URL_PATTERN.sub('', text)
+        return CIK_PATTERN.sub('', text)
+
+
+class IncrementalChunker:
+    """
+    Streaming smart_chunk: feed() cleaned text as it arrives and get back every chunk that
+    no longer depends on text still to come; finish() flushes the tail. The output is
+    identical to smart_chunk over the concatenated text, while only about one chunk of
+    text is buffered.
+    """
+
+    def __init__(self, chunk_size: int = 1500, overlap: int = 200):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self._buffer = ""
+        self._start = 0
+
+    def feed(self, text: str) -> list[str]:
+        self._buffer += text
+        chunks = []
+        # Once more than chunk_size chars follow start, this chunk's end is final
+        while len(self._buffer) - self._start > self.chunk_size:
+            start = self._start
+            end = start + self.chunk_size
+            last_period = self._buffer.rfind('. ', start, end)
+            if last_period != -1 and last_period > start + (self.chunk_size // 2):
+                end = last_period + 1
+
+            chunk = self._buffer[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            self._start = max(end - self.overlap, 0)
+
+        # Drop text no future chunk can reach
+        if self._start:
+            self._buffer = self._buffer[self._start:]
+            self._start = 0
+        return chunks
+
+    def finish(self) -> list[str]:
+        if not self._buffer:
+            return []
+        # The remainder is at most chunk_size past start: smart_chunk's final iteration
+        chunk = self._buffer[self._start:].strip()
+        self._buffer = ""
+        return [chunk] if chunk else []
+
+
+def parse_filing(html_path: str) -> str:
+    """Filing on disk -> cleaned text. Runs inside a pool worker."""
+    return advanced_clean(clean_text(html_path))
+
+
+def clean_and_chunk(text: str) -> list[str]:
+    """Raw (manually supplied) text -> chunks. Runs inside a pool worker."""
+    return smart_chunk(advanced_clean(text))
+
+
+_parse_pool: ProcessPoolExecutor | None = None
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+    return _parse_pool
+
+
+def shutdown_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+
+def submit_to_parse_pool(func, *args, **kwargs) -> Future:
+    """Starts a module-level (picklable) function in the parse pool; the future is thread-safe."""
+    return get_parse_pool().submit(functools.partial(func, *args, **kwargs))
+
+
+async def run_in_parse_pool(func, *args, **kwargs):
+    """Runs a module-level (picklable) function in the parse pool and awaits the result."""
+    return await asyncio.wrap_future(submit_to_parse_pool(func, *args, **kwargs))
@@ -0,0 +1,172 @@
+import os
+import time
+import asyncio
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Filing
+
+# Memory budget for cached (ticker, year) slices. A 3072-dim float32 row is 12KB,
+# so a full 10-K (~400 chunks) takes ~5MB.
+VECTOR_CACHE_MAX_BYTES = int(os.getenv("VECTOR_CACHE_MAX_MB", "512")) * 1024 * 1024
+# Other processes (e.g. ingestion workers) can't invalidate our copy, so slices also expire
+VECTOR_CACHE_TTL = float(os.getenv("VECTOR_CACHE_TTL", "300"))
+# Slices to load at startup, e.g. "AAPL:2023,MSFT:2023"
+VECTOR_CACHE_WARM = os.getenv("VECTOR_CACHE_WARM", "")
+
+
+@dataclass
+class FilingSlice:
+    """All chunks of one (ticker, year) as a contiguous float32 matrix plus row metadata."""
+    ticker: str
+    year: int
+    ids: np.ndarray            # (n,) int64
+    chunk_indices: np.ndarray  # (n,) int64
+    texts: list[str]
+    matrix: np.ndarray         # (n, dims) float32, C-contiguous
+    sq_norms: np.ndarray       # (n,) float32, ||row||^2
+    loaded_at: float
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + self.ids.nbytes + self.chunk_indices.nbytes + sum(len(t) for t in self.texts)
+
+    def top_k(self, queries: np.ndarray, k: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        Scores every query against every row with a single matrix multiply and returns,
+        per query, (row positions, L2 distances) of the k nearest rows, closest first.
+        """
+        if len(self.ids) == 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in range(len(queries))]
+
+        queries = np.asarray(queries, dtype=np.float32)
+        # ||q - x||^2 = ||q||^2 - 2 q.x + ||x||^2
+        sq_dists = (
+            (queries * queries).sum(axis=1)[:, None]
+            - 2.0 * (queries @ self.matrix.T)
+            + self.sq_norms[None, :]
+        )
+        k = min(k, sq_dists.shape[1])
+        results = []
+        for row in sq_dists:
+            top = np.argpartition(row, k - 1)[:k]
+            top = top[np.argsort(row[top])]
+            results.append((top, np.sqrt(np.maximum(row[top], 0.0))))
+        return results
+
+
+class FilingMatrixCache:
+    """
+    LRU cache of per-(ticker, year) embedding matrices, bounded by memory.
+    Lets vector scoring run in-process instead of round-tripping to Postgres.
+    """
+
+    def __init__(self, max_bytes: int = VECTOR_CACHE_MAX_BYTES, ttl: float = VECTOR_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._slices: OrderedDict[tuple[str, int], FilingSlice] = OrderedDict()
+        self._loading: dict[tuple[str, int], asyncio.Lock] = {}
+        # Bumped on invalidation so a load that raced with new writes isn't stored
+        self._generations: dict[tuple[str, int], int] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def _load(self, db: AsyncSession, ticker: str, year: int) -> FilingSlice:
+        stmt = (
+            select(Filing.id, Filing.chunk_index, Filing.text_content, Filing.embedding)
+            .where(Filing.ticker == ticker, Filing.year == year, Filing.embedding.is_not(None))
+            .order_by(Filing.id)
+        )
+        rows = (await db.execute(stmt)).all()
+
+        if rows:
+            matrix = np.ascontiguousarray(np.stack([np.asarray(r.embedding, dtype=np.float32) for r in rows]))
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        return FilingSlice(
+            ticker=ticker,
+            year=year,
+            ids=np.array([r.id for r in rows], dtype=np.int64),
+            chunk_indices=np.array([r.chunk_index if r.chunk_index is not None else -1 for r in rows], dtype=np.int64),
+            texts=[r.text_content for r in rows],
+            matrix=matrix,
+            sq_norms=(matrix * matrix).sum(axis=1) if rows else np.empty(0, dtype=np.float32),
+            loaded_at=time.monotonic(),
+        )
+
+    def _store(self, key: tuple[str, int], slice_: FilingSlice):
+        self._drop(key)
+        self._slices[key] = slice_
+        self.total_bytes += slice_.nbytes
+        while self.total_bytes > self.max_bytes and len(self._slices) > 1:
+            oldest = next(iter(self._slices))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key: tuple[str, int]):
+        old = self._slices.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old.nbytes
+
+    async def get(self, db: AsyncSession, ticker: str, year: int) -> FilingSlice:
+        key = (ticker, year)
+        slice_ = self._slices.get(key)
+        if slice_ is not None and time.monotonic() - slice_.loaded_at < self.ttl:
+            self._slices.move_to_end(key)
+            self.hits += 1
+            return slice_
+
+        # Only one coroutine loads a given slice; the rest wait for it
+        lock = self._loading.setdefault(key, asyncio.Lock())
+        async with lock:
+            slice_ = self._slices.get(key)
+            if slice_ is not None and time.monotonic() - slice_.loaded_at < self.ttl:
+                self.hits += 1
+                return slice_
+
+            self.misses += 1
+            generation = self._generations.get(key, 0)
+            slice_ = await self._load(db, ticker, year)
+            if self._generations.get(key, 0) == generation:
+                self._store(key, slice_)
+            return slice_
+
+    def invalidate(self, ticker: str, year: int):
+        """Called after new chunks are written for (ticker, year)."""
+        key = (ticker, year)
+        self._generations[key] = self._generations.get(key, 0) + 1
+        self._drop(key)
+
+    async def warm(self, pairs: list[tuple[str, int]]):
+        from app.database import AsyncSessionLocal
+        async with AsyncSessionLocal() as db:
+            for ticker, year in pairs:
+                slice_ = await self.get(db, ticker, year)
+                print(f"[VectorCache] Warmed {ticker} {year}: {len(slice_.ids)} chunks")
+
+    def stats(self) -> dict:
+        return {
+            "slices": len(self._slices),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def parse_warm_list(value: str = VECTOR_CACHE_WARM) -> list[tuple[str, int]]:
+    pairs = []
+    for item in value.split(","):
+        item = item.strip()
+        if ":" in item:
+            ticker, year = item.split(":", 1)
+            pairs.append((ticker.strip().upper(), int(year)))
+    return pairs
+
+
+filing_matrix_cache = FilingMatrixCache()
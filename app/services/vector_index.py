@@ -0,0 +1,220 @@
+import os
+from sqlalchemy import text, select, func, literal, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import engine
+
+# pgvector can't index vector(3072) directly (HNSW/IVFFlat max out at 2000 dims),
+# but halfvec indexes go up to 4000 dims. We index an expression that casts the
+# stored embedding to halfvec, and the search query orders by the same expression.
+VECTOR_DIMENSIONS = 3072
+HALFVEC_EXPRESSION = f"(embedding::halfvec({VECTOR_DIMENSIONS}))"
+
+# Truncated, renormalized Matryoshka prefix stored in filings.embedding_short.
+# At 768 dims it's indexable as a plain vector.
+SHORT_VECTOR_DIMENSIONS = 768
+
+# Binary-quantized signature stored in filings.embedding_bits (1 bit per dimension)
+BIT_VECTOR_DIMENSIONS = VECTOR_DIMENSIONS
+
+VECTOR_INDEX_NAME = "idx_filings_embedding_ann"
+SHORT_VECTOR_INDEX_NAME = "idx_filings_embedding_short_ann"
+BIT_VECTOR_INDEX_NAME = "idx_filings_embedding_bits_ann"
+
+# index name -> (indexed expression, operator class)
+ANN_INDEXES = {
+    VECTOR_INDEX_NAME: (HALFVEC_EXPRESSION, "halfvec_l2_ops"),
+    SHORT_VECTOR_INDEX_NAME: ("embedding_short", "vector_l2_ops"),
+    BIT_VECTOR_INDEX_NAME: ("embedding_bits", "bit_hamming_ops"),
+}
+
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw")  # "hnsw" or "ivfflat"
+
+# Build parameters
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "100"))
+INDEX_MAINTENANCE_WORK_MEM = os.getenv("INDEX_MAINTENANCE_WORK_MEM", "1GB")
+
+# Default query-time parameters (overridable per query)
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+# Every search filters on (ticker, year). Iterative scans (pgvector >= 0.8) keep walking
+# the index until enough rows pass the filter; set to "" on older pgvector versions.
+HNSW_ITERATIVE_SCAN = os.getenv("HNSW_ITERATIVE_SCAN", "relaxed_order")
+
+
+def _index_ddl(name: str, expression: str, opclass: str, index_type: str = VECTOR_INDEX_TYPE) -> str:
+    if index_type == "hnsw":
+        method = "hnsw"
+        options = f"m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}"
+    elif index_type == "ivfflat":
+        method = "ivfflat"
+        options = f"lists = {IVFFLAT_LISTS}"
+    else:
+        raise ValueError(f"Unknown vector index type: {index_type}")
+
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON filings "
+        f"USING {method} ({expression} {opclass}) WITH ({options})"
+    )
+
+
+async def _autocommit_connection():
+    # CREATE/DROP INDEX CONCURRENTLY can't run inside a transaction block
+    conn = await engine.connect()
+    return await conn.execution_options(isolation_level="AUTOCOMMIT")
+
+
+async def index_status(name: str = VECTOR_INDEX_NAME) -> dict | None:
+    """Returns definition, validity and size of the index, or None if it doesn't exist."""
+    async with engine.connect() as conn:
+        row = (await conn.execute(text("""
+            SELECT pg_get_indexdef(i.indexrelid) AS definition,
+                   i.indisvalid AS is_valid,
+                   pg_size_pretty(pg_relation_size(i.indexrelid)) AS size
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = :name
+        """), {"name": name})).mappings().first()
+    return dict(row) if row else None
+
+
+async def _try_lock_index(conn, name: str) -> bool:
+    """
+    Session-level advisory lock per index name, so only one process (API replica, worker,
+    script) builds, drops or swaps a given index at a time.
+    """
+    return (await conn.execute(
+        text("SELECT pg_try_advisory_lock(hashtext(:key))"), {"key": f"vector_index:{name}"}
+    )).scalar()
+
+
+async def _unlock_index(conn, name: str):
+    # The connection goes back to the pool, so the session lock must be released explicitly
+    await conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {"key": f"vector_index:{name}"})
+
+
+async def _build_in_progress(conn, name: str) -> bool:
+    """True if some backend is still building the index (e.g. one started by hand, outside the lock)."""
+    return (await conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_stat_progress_create_index p
+            JOIN pg_class c ON c.oid = p.index_relid
+            WHERE c.relname = :name
+        )
+    """), {"name": name})).scalar()
+
+
+async def ensure_vector_index(name: str = VECTOR_INDEX_NAME, index_type: str = VECTOR_INDEX_TYPE):
+    """
+    Builds an ANN index if it's missing. The build runs CONCURRENTLY, so reads and
+    ingestion keep working while it's in progress. An invalid index left behind by an
+    interrupted build is dropped and rebuilt; an invalid index that is still being built
+    (by another process) is left alone.
+    """
+    expression, opclass = ANN_INDEXES[name]
+    status = await index_status(name)
+    if status and status["is_valid"]:
+        return
+
+    conn = await _autocommit_connection()
+    try:
+        if not await _try_lock_index(conn, name):
+            print(f"Vector index {name} is being built by another process; skipping.")
+            return
+        try:
+            # Re-check under the lock: another process may have finished it since the first check
+            status = await index_status(name)
+            if status and status["is_valid"]:
+                return
+            if status:
+                if await _build_in_progress(conn, name):
+                    print(f"Vector index {name} is still being built by another session; skipping.")
+                    return
+                print(f"Dropping invalid vector index {name} from an interrupted build...")
+                await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+            print(f"Building {index_type} vector index {name} (concurrently)...")
+            await conn.execute(text(f"SET maintenance_work_mem = '{INDEX_MAINTENANCE_WORK_MEM}'"))
+            await conn.execute(text(_index_ddl(name, expression, opclass, index_type)))
+            print(f"Vector index {name} is ready.")
+        finally:
+            await _unlock_index(conn, name)
+    finally:
+        await conn.close()
+
+
+async def ensure_vector_indexes(index_type: str = VECTOR_INDEX_TYPE):
+    for name in ANN_INDEXES:
+        await ensure_vector_index(name, index_type)
+
+
+async def rebuild_vector_index(name: str = VECTOR_INDEX_NAME, index_type: str = VECTOR_INDEX_TYPE):
+    """
+    Rebuilds an ANN index without downtime: a replacement is built concurrently next
+    to the live index, then swapped in. Use this after large ingests (IVFFlat lists are
+    trained on the data present at build time) or to switch index types/parameters.
+    """
+    expression, opclass = ANN_INDEXES[name]
+    new_name = f"{name}_new"
+    conn = await _autocommit_connection()
+    try:
+        if not await _try_lock_index(conn, name):
+            raise RuntimeError(f"Vector index {name} is being built or rebuilt by another process")
+        try:
+            if await _build_in_progress(conn, new_name):
+                raise RuntimeError(f"A rebuild of {name} ({new_name}) is already in progress")
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {new_name}"))
+            await conn.execute(text(f"SET maintenance_work_mem = '{INDEX_MAINTENANCE_WORK_MEM}'"))
+            print(f"Building replacement {index_type} index {new_name} (concurrently)...")
+            await conn.execute(text(_index_ddl(new_name, expression, opclass, index_type)))
+
+            # Queries use the new index as soon as the old one is gone
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            await conn.execute(text(f"ALTER INDEX {new_name} RENAME TO {name}"))
+            print(f"Swapped in rebuilt vector index {name}.")
+        finally:
+            await _unlock_index(conn, name)
+    finally:
+        await conn.close()
+
+
+def _search_settings(ef_search: int | None = None, probes: int | None = None) -> dict[str, str]:
+    settings = {
+        "hnsw.ef_search": str(int(ef_search or HNSW_EF_SEARCH)),
+        "ivfflat.probes": str(int(probes or IVFFLAT_PROBES)),
+    }
+    if HNSW_ITERATIVE_SCAN:
+        settings["hnsw.iterative_scan"] = HNSW_ITERATIVE_SCAN
+        settings["ivfflat.iterative_scan"] = "relaxed_order"
+    return settings
+
+
+def search_params_cte(ef_search: int | None = None, probes: int | None = None, name: str = "search_params"):
+    """
+    One-row CTE that applies the ANN query parameters (transaction-local, like SET LOCAL)
+    when it is evaluated. Selecting the query rows FROM it makes every index scan that depends
+    on them start after the settings are in place, so the settings ride along in the search
+    statement itself instead of costing a separate round trip.
+    """
+    columns = [
+        func.set_config(literal(setting), literal(value), true()).label(f"p{i}")
+        for i, (setting, value) in enumerate(_search_settings(ef_search, probes).items())
+    ]
+    return select(*columns).cte(name)
+
+
+async def apply_search_params(db: AsyncSession, ef_search: int | None = None, probes: int | None = None):
+    """
+    Sets ANN query parameters for the current transaction only (is_local => SET LOCAL
+    semantics), so different searches sharing a connection pool can use different
+    recall/speed trade-offs. All settings go in a single round trip. Searches use
+    search_params_cte instead, which needs no round trip of its own.
+    """
+    params = {}
+    calls = []
+    for i, (name, value) in enumerate(_search_settings(ef_search, probes).items()):
+        params[f"name{i}"] = name
+        params[f"value{i}"] = value
+        calls.append(f"set_config(:name{i}, :value{i}, true)")
+    await db.execute(text(f"SELECT {', '.join(calls)}"), params)
@@ -1,31 +1,170 @@
 import asyncio
-import sys
+import time
 import argparse
 from app.database import AsyncSessionLocal
-from app.services.ingestion_service import IngestionService
+from app.services.ingestion_service import ingestion_stats
+from app.services.ingestion_progress import get_coverage
+from app.services.job_queue import IngestionWorker, enqueue_ingestion
+from app.services.text_processing import shutdown_parse_pool
+from app.agents.utils import call_priority, BULK, EMBEDDING_MODEL, get_rate_limiter, rate_limit_stats
 
-async def bulk_ingest(tickers: list[str], year: int):
+# Filings ingested at once. Each has its own session, so download (thread), parse (the shared
+# parse process pool, PARSE_WORKERS filings across cores at a time) and embed (rate limiter)
+# of different filings overlap; keep it under the DB pool size.
+DEFAULT_CONCURRENCY = 8
+
+
+def parse_tickers(value: str | None, files: list[str]) -> list[str]:
+    """Comma-separated tickers plus ticker files (one or more per line, '#' comments). Deduplicated, in order."""
+    raw = value.split(",") if value else []
+    for path in files:
+        with open(path) as f:
+            for line in f:
+                raw.extend(line.split("#", 1)[0].replace(",", " ").split())
+    tickers = []
+    for ticker in raw:
+        ticker = ticker.strip().upper()
+        if ticker and ticker not in tickers:
+            tickers.append(ticker)
+    return tickers
+
+
+def parse_years(value: str) -> list[int]:
+    """'2023', '2019-2023' or '2019,2021-2023' -> sorted years."""
+    years = set()
+    for part in value.split(","):
+        part = part.strip()
+        if "-" in part:
+            start, end = (int(y) for y in part.split("-", 1))
+            years.update(range(min(start, end), max(start, end) + 1))
+        elif part:
+            years.add(int(part))
+    return sorted(years)
+
+
+class BulkProgress:
+    """Filing outcomes, chunks written and embedding quota drawn, reported as rates while the load runs."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.embedder = get_rate_limiter(EMBEDDING_MODEL)
+        self._start = self._snapshot()
+        self._last = self._start
+
+    @property
+    def finished(self) -> int:
+        return self.done + self.skipped + self.failed
+
+    def _snapshot(self) -> tuple:
+        return (time.monotonic(), self.finished, ingestion_stats.chunks_written,
+                self.embedder.requests_used, self.embedder.tokens_used)
+
+    def report(self, final: bool = False):
+        now = self._snapshot()
+        since = self._start if final else self._last
+        self._last = now
+        minutes = max(now[0] - since[0], 1e-9) / 60
+        filings_rate, chunks_rate, rpm, tpm = ((a - b) / minutes for a, b in zip(now[1:], since[1:]))
+
+        limiter = self.embedder.stats()
+        print(
+            f"[{'Done' if final else 'Progress'} {(now[0] - self.started) / 60:.1f}m] "
+            f"{self.finished}/{self.total} filings ({self.done} ok, {self.skipped} skipped, {self.failed} failed) | "
+            f"{filings_rate:.1f} filings/min | "
+            f"{chunks_rate / 60:.1f} chunks written/s | "
+            # Embed API usage counts every request sent (retries included, cache hits excluded)
+            f"embedding quota: {rpm:.0f}/{limiter['max_rpm']} rpm ({rpm / limiter['max_rpm']:.0%}), "
+            f"{tpm:.0f}/{limiter['max_tpm']} tpm, limiter at {limiter['fraction_of_quota']:.0%}, "
+            f"{limiter['throttles']} throttled"
+        )
+
+
+async def ingest_one(worker: IngestionWorker, ticker: str, year: int, progress: BulkProgress):
+    """
+    Ingests one filing through the job queue rather than around it: the filing gets (or joins)
+    its single-flight job, which this process claims and runs like a worker would. A filing
+    whose job is already running elsewhere is left to that worker.
+    """
+    # A session per filing: concurrent filings never share a connection or transaction
     async with AsyncSessionLocal() as db:
-        ingester = IngestionService(db)
-        for idx, ticker in enumerate(tickers):
-            ticker = ticker.strip().upper()
-            print(f"\n--- Processing {ticker} {year} ({idx + 1}/{len(tickers)}) ---")
-            try:
-                await ingester.ingest_if_missing(ticker, year)
-            except Exception as e:
-                print(f"Failed to ingest {ticker}: {e}")
-            
-            # Rate limit: 3s delay between companies to stay under Gemini free tier limits
-            if idx < len(tickers) - 1:
-                print(f"Waiting 3s before next company...")
-                await asyncio.sleep(3)
+        coverage = (await get_coverage(db, [(ticker, year)]))[(ticker, year)]
+        if coverage["status"] == "complete":
+            progress.skipped += 1
+            return
+        job_id = await enqueue_ingestion(db, ticker, year)
+
+    job = await worker.claim_job(job_id)
+    if job is None:
+        progress.skipped += 1
+        print(f"{ticker} {year} is already being ingested by another worker (job {job_id}); skipping.")
+        return
+    error = await worker.process(job)
+    if error is None:
+        progress.done += 1
+    else:
+        # The job keeps its retry schedule, so queue workers pick it up again later
+        progress.failed += 1
+
+
+async def bulk_ingest(tickers: list[str], years: list[int], concurrency: int = DEFAULT_CONCURRENCY,
+                      report_interval: float = 30):
+    # Lowest class: bulk loads only use quota that interactive and queued work leave over
+    with call_priority(BULK):
+        # Year-major, so every ticker's latest filings land before older years
+        filings: asyncio.Queue = asyncio.Queue()
+        for year in sorted(years, reverse=True):
+            for ticker in tickers:
+                filings.put_nowait((ticker, year))
+        progress = BulkProgress(filings.qsize())
+        print(f"Ingesting {progress.total} filings ({len(tickers)} tickers x {len(years)} years), "
+              f"{concurrency} at a time...")
+
+        async def worker():
+            ingestion_worker = IngestionWorker()
+            while not filings.empty():
+                ticker, year = filings.get_nowait()
+                try:
+                    await ingest_one(ingestion_worker, ticker, year, progress)
+                except Exception as e:
+                    progress.failed += 1
+                    print(f"Failed to ingest {ticker} {year}: {e}")
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(report_interval)
+                progress.report()
+
+        reporting = asyncio.create_task(reporter())
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        finally:
+            reporting.cancel()
+        progress.report(final=True)
+        print(f"Rate limiters: {rate_limit_stats()}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Bulk ingest SEC filings into the database.")
-    parser.add_argument("tickers", help="Comma-separated list of tickers (e.g., AAPL,MSFT,GOOGL)")
+    parser.add_argument("tickers", nargs="?", help="Comma-separated list of tickers (e.g., AAPL,MSFT,GOOGL)")
+    parser.add_argument("--tickers-file", action="append", default=[],
+                        help="File with tickers, one or more per line ('#' comments); may be repeated")
     parser.add_argument("--year", type=int, default=2023, help="Fiscal year to ingest (default: 2023)")
-    
+    parser.add_argument("--years", help="Years or ranges, e.g. 2019-2023 or 2019,2021 (overrides --year)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Filings ingested in parallel (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--report-interval", type=float, default=30,
+                        help="Seconds between progress reports (default: 30)")
+
     args = parser.parse_args()
-    
-    ticker_list = args.tickers.split(",")
-    asyncio.run(bulk_ingest(ticker_list, args.year))
+
+    ticker_list = parse_tickers(args.tickers, args.tickers_file)
+    if not ticker_list:
+        parser.error("no tickers given (pass a list and/or --tickers-file)")
+    year_list = parse_years(args.years) if args.years else [args.year]
+    try:
+        asyncio.run(bulk_ingest(ticker_list, year_list, max(1, args.concurrency), args.report_interval))
+    finally:
+        shutdown_parse_pool()
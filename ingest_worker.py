@@ -0,0 +1,23 @@
+import asyncio
+import argparse
+from app.database import init_db
+from app.services.job_queue import run_workers
+from app.services.text_processing import shutdown_parse_pool
+
+async def main(workers: int):
+    await init_db()
+    print(f"Starting {workers} ingestion worker(s). Jobs are claimed with SKIP LOCKED, so run as many of these as you like.")
+    await run_workers(workers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background ingestion workers against the ingestion_jobs queue.")
+    parser.add_argument("--workers", type=int, default=2, help="Concurrent jobs in this process (default: 2)")
+
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args.workers))
+    except KeyboardInterrupt:
+        print("Stopping workers. Jobs in progress will be retried once their lease expires.")
+    finally:
+        shutdown_parse_pool()
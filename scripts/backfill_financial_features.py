@@ -0,0 +1,53 @@
+import asyncio
+import argparse
+from sqlalchemy import select, update, bindparam
+from app.database import init_db, AsyncSessionLocal
+from app.models import Filing
+from app.services.chunk_features import compute_financial_features
+
+
+async def backfill(batch_size: int):
+    """Computes financial-boost features for rows ingested before they were precomputed."""
+    await init_db()
+    total = 0
+    last_id = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            stmt = (
+                select(Filing.id, Filing.text_content)
+                .where(Filing.id > last_id, Filing.financial_boost.is_(None))
+                .order_by(Filing.id)
+                .limit(batch_size)
+            )
+            rows = (await db.execute(stmt)).all()
+            if not rows:
+                break
+
+            params = [{"row_id": r.id, **compute_financial_features(r.text_content or "")} for r in rows]
+            await db.execute(
+                update(Filing.__table__)
+                .where(Filing.__table__.c.id == bindparam("row_id"))
+                .values(
+                    dollar_count=bindparam("dollar_count"),
+                    large_number_count=bindparam("large_number_count"),
+                    has_income_keyword=bindparam("has_income_keyword"),
+                    has_section_header=bindparam("has_section_header"),
+                    financial_boost=bindparam("financial_boost"),
+                ),
+                params,
+            )
+            await db.commit()
+
+            total += len(rows)
+            last_id = rows[-1].id
+            print(f"Backfilled {total} rows...")
+
+    print(f"Done. Backfilled financial features for {total} rows.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill precomputed financial-boost features on existing filings rows.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    asyncio.run(backfill(args.batch_size))
@@ -0,0 +1,76 @@
+import asyncio
+import argparse
+import random
+import math
+import time
+from sqlalchemy import delete
+from app.database import init_db, AsyncSessionLocal
+from app.models import Filing
+from app.services.chunk_writer import ChunkWriter, ChunkRecord
+from app.agents.utils import shorten_embedding, binary_quantize
+from app.services.chunk_features import compute_financial_features
+
+BENCH_TICKER = "ZZBENCH"
+
+
+def synthetic_records(n: int, year: int) -> list[ChunkRecord]:
+    """Random unit vectors and 10-K-sized text, so no embedding API calls are needed."""
+    records = []
+    for i in range(n):
+        vector = [random.gauss(0, 1) for _ in range(3072)]
+        norm = math.sqrt(sum(x * x for x in vector))
+        text = f"Net sales were $383,285 million in fiscal {year}, chunk {i}. " * 25  # ~1500 chars
+        records.append(ChunkRecord(BENCH_TICKER, year, 1000 + i, text, [x / norm for x in vector]))
+    return records
+
+
+async def write_orm(records: list[ChunkRecord]):
+    """The previous row-by-row ORM path, for comparison."""
+    async with AsyncSessionLocal() as db:
+        for r in records:
+            db.add(Filing(
+                ticker=r.ticker, year=r.year, chunk_index=r.chunk_index, text_content=r.text_content,
+                embedding=r.embedding,
+                embedding_short=shorten_embedding(r.embedding, 768),
+                embedding_bits=binary_quantize(r.embedding),
+                **compute_financial_features(r.text_content)
+            ))
+        await db.commit()
+
+
+async def write_bulk(records: list[ChunkRecord], mode: str, batch_size: int):
+    async with AsyncSessionLocal() as db:
+        await ChunkWriter(db, mode=mode, batch_size=batch_size).write(records)
+        await db.commit()
+
+
+async def bench(n: int, batch_size: int, modes: list[str]):
+    await init_db()
+    print(f"--- Chunk writer: {n} rows per run (batch size {batch_size}) ---")
+    for i, mode in enumerate(modes):
+        year = 1900 + i
+        records = synthetic_records(n, year)
+        start = time.perf_counter()
+        if mode == "orm":
+            await write_orm(records)
+        else:
+            await write_bulk(records, mode, batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"{mode:<7} {elapsed:7.2f}s  {n / elapsed:9.1f} rows/sec")
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Filing).where(Filing.ticker == BENCH_TICKER))
+        await db.commit()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Compare rows/sec of ORM, multi-row INSERT and COPY chunk writes.")
+    parser.add_argument("-n", type=int, default=400, help="Rows per run (a full 10-K is a few hundred chunks)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--modes", default="orm,insert,copy")
+    args = parser.parse_args()
+
+    asyncio.run(bench(args.n, args.batch_size, args.modes.split(",")))
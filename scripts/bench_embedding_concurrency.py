@@ -0,0 +1,89 @@
+import asyncio
+import argparse
+import json
+import time
+import uuid
+
+from app.agents.utils import get_embedding, EMBEDDING_CONCURRENCY
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Returns the worst delay observed between scheduled wake-ups of the event loop."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def bench_embeddings(n: int):
+    """
+    Fires N query embeddings at once, as N simultaneous /analyze streams would.
+    Unique texts bypass the embedding cache so every call hits the API.
+    """
+    texts = [f"Find the total revenue for 2023 ({uuid.uuid4()})" for _ in range(n)]
+
+    # Baseline: a single call
+    start = time.perf_counter()
+    await get_embedding(f"Find the total revenue for 2023 ({uuid.uuid4()})")
+    single = time.perf_counter() - start
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(get_embedding(t) for t in texts))
+    concurrent = time.perf_counter() - start
+    stop.set()
+    worst_lag = await lag_task
+
+    print(f"--- Embedding concurrency (pool size {EMBEDDING_CONCURRENCY}) ---")
+    print(f"Single call:            {single:.2f}s")
+    print(f"{n} concurrent calls:    {concurrent:.2f}s (serialized would be ~{single * n:.2f}s)")
+    print(f"Speedup vs serialized:  {single * n / concurrent:.1f}x")
+    print(f"Worst event loop lag:   {worst_lag * 1000:.1f}ms")
+
+
+async def bench_analyze(n: int, url: str):
+    """Opens N simultaneous /analyze streams against a running server and times each phase."""
+    # Only needed for --url, and not a project dependency
+    import httpx
+
+    payload = {"user_input": "What was Apple's total revenue in 2023?"}
+
+    async def one_stream():
+        start = time.perf_counter()
+        first_event = None
+        async with httpx.AsyncClient(timeout=300.0) as client:
+            async with client.stream("POST", f"{url}/analyze", json=payload) as response:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    if first_event is None:
+                        first_event = time.perf_counter() - start
+                    if json.loads(line[6:]).get("type") == "done":
+                        break
+        return first_event, time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one_stream() for _ in range(n)))
+    total = time.perf_counter() - start
+
+    print(f"--- {n} simultaneous /analyze streams ---")
+    for i, (first_event, elapsed) in enumerate(results):
+        print(f"  stream {i + 1}: first event {first_event or 0:.2f}s, done {elapsed:.2f}s")
+    print(f"Wall time: {total:.2f}s (slowest single stream {max(r[1] for r in results):.2f}s)")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Benchmark concurrent embedding calls.")
+    parser.add_argument("-n", type=int, default=16, help="Number of simultaneous requests")
+    parser.add_argument("--url", help="Also benchmark /analyze streams against a running server (e.g. http://localhost:8000)")
+    args = parser.parse_args()
+
+    asyncio.run(bench_embeddings(args.n))
+    if args.url:
+        asyncio.run(bench_analyze(args.n, args.url))
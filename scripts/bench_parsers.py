@@ -0,0 +1,41 @@
+import argparse
+import glob
+import os
+import time
+from app.services.sec_service import clean_text
+from app.services.html_text import TEXT_BACKENDS
+
+DEFAULT_GLOB = os.path.join("sec_downloads", "sec-edgar-filings", "*", "10-K", "*", "*.txt")
+
+
+def bench(paths: list[str], backends: list[str], runs: int):
+    """
+    Times clean_text per backend. Throughput is reported against the size of
+    the files on disk (full submissions include exhibits that are skipped, not parsed).
+    """
+    total_mb = sum(os.path.getsize(p) for p in paths) / (1024 * 1024)
+
+    print(f"--- HTML-to-text backends: {len(paths)} filings, {total_mb:.1f} MB, {runs} runs ---")
+    print(f"{'backend':<8} {'avg s':>8} {'MB/s':>8} {'chars':>10}")
+    for backend in backends:
+        timings = []
+        chars = 0
+        for _ in range(runs):
+            start = time.perf_counter()
+            chars = sum(len(clean_text(p, backend=backend)) for p in paths)
+            timings.append(time.perf_counter() - start)
+        avg = sum(timings) / len(timings)
+        print(f"{backend:<8} {avg:>8.2f} {total_mb / avg:>8.1f} {chars:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HTML-to-text parser backends over sample 10-Ks.")
+    parser.add_argument("paths", nargs="*", help=f"Filing files (default: {DEFAULT_GLOB})")
+    parser.add_argument("--backends", default=",".join(TEXT_BACKENDS), help="Comma-separated backends to compare")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(DEFAULT_GLOB))
+    if not paths:
+        raise SystemExit("No filings found; download some first (e.g. scripts/verify_sec_download.py) or pass paths.")
+    bench(paths, args.backends.split(","), args.runs)
@@ -0,0 +1,75 @@
+import asyncio
+import argparse
+import time
+from app.database import AsyncSessionLocal
+from app.agents.search import SearchAgent, SEARCH_MODES
+from app.agents.utils import get_embedding
+from app.services.vector_index import apply_search_params
+
+QUERIES = [
+    "Find the total revenue for 2023",
+    "Consolidated Statements of Operations net income",
+    "research and development expense",
+    "operating income by segment",
+    "risk factors related to supply chain",
+    "share repurchase program",
+]
+
+
+async def bench(ticker: str, year: int, k: int, runs: int, modes: list[str]):
+    """
+    Compares vector-stage recall@k and latency of each retrieval mode against the exact
+    full-vector scan. Only the vector stage is timed; keyword search and RRF are identical
+    across modes.
+    """
+    async with AsyncSessionLocal() as db:
+        agent = SearchAgent(db)
+        embeddings = [await get_embedding(q) for q in QUERIES]
+
+        async def top_ids(mode: str, embedding: list[float]) -> tuple[list[int], float]:
+            """Returns the top ids and the milliseconds spent in the vector query itself."""
+            if mode == "memory":
+                start = time.perf_counter()
+                hits = (await agent._memory_search([embedding], ticker, year, k))[0]
+                return [hit.id for hit in hits], (time.perf_counter() - start) * 1000
+            # Outside the timed section: searches set these inside their own statement
+            # (search_params_cte), so this round trip isn't part of a mode's latency
+            await apply_search_params(db)
+            start = time.perf_counter()
+            rows = (await db.execute(agent._vector_stmt(embedding, ticker, year, k, mode=mode))).all()
+            elapsed = (time.perf_counter() - start) * 1000
+            await db.rollback()  # end the transaction so SET LOCAL doesn't leak
+            return [r.id for r in rows], elapsed
+
+        truth = [(await top_ids("exact", e))[0] for e in embeddings]
+
+        print(f"--- Vector retrieval modes for {ticker} {year} (k={k}, {runs} runs x {len(QUERIES)} queries) ---")
+        print(f"{'mode':<12} {'recall@k':>9} {'avg ms':>9} {'p95 ms':>9}")
+        for mode in modes:
+            latencies = []
+            recalls = []
+            for _ in range(runs):
+                for embedding, expected in zip(embeddings, truth):
+                    ids, latency = await top_ids(mode, embedding)
+                    latencies.append(latency)
+                    if expected:
+                        recalls.append(len(set(ids) & set(expected)) / len(expected))
+            latencies.sort()
+            recall = sum(recalls) / len(recalls) if recalls else 0.0
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+            print(f"{mode:<12} {recall:>9.3f} {sum(latencies) / len(latencies):>9.1f} {p95:>9.1f}")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Compare recall and latency of vector retrieval modes.")
+    parser.add_argument("--ticker", default="AAPL")
+    parser.add_argument("--year", type=int, default=2023)
+    parser.add_argument("-k", type=int, default=15, help="Vector candidates per query (search uses limit * 3)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", default=",".join(SEARCH_MODES), help="Comma-separated modes to compare")
+    args = parser.parse_args()
+
+    asyncio.run(bench(args.ticker, args.year, args.k, args.runs, args.modes.split(",")))
@@ -1,12 +1,11 @@
 import asyncio
 from app.database import AsyncSessionLocal
-from app.models import Filing
-from sqlalchemy import delete
+from app.services.ingestion_progress import clear_filing
 
 async def run():
     async with AsyncSessionLocal() as db:
-        await db.execute(delete(Filing).where(Filing.ticker == 'MSFT', Filing.year == 2023))
-        await db.commit()
+        # Progress goes with the rows, or the filing would still count as fully ingested
+        await clear_filing(db, 'MSFT', 2023)
         print('Deleted MSFT 2023 data for re-ingestion.')
 
 if __name__ == "__main__":
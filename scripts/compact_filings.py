@@ -0,0 +1,37 @@
+import asyncio
+from sqlalchemy import text
+from app.database import init_db, engine, ensure_content_hash_index
+
+
+async def compact():
+    """
+    Removes duplicate chunks (same ticker, year and text), keeping the oldest row,
+    then creates the unique index that keeps new writes idempotent.
+    """
+    await init_db()  # makes sure content_hash is populated
+    async with engine.begin() as conn:
+        result = await conn.execute(text("""
+            DELETE FROM filings a
+            USING filings b
+            WHERE a.ticker = b.ticker
+              AND a.year = b.year
+              AND a.content_hash = b.content_hash
+              AND a.id > b.id
+        """))
+        print(f"Removed {result.rowcount} duplicate chunks.")
+
+        if await ensure_content_hash_index(conn):
+            print("Unique (ticker, year, content_hash) index is in place.")
+        else:
+            print("Could not create the unique index; duplicates were written concurrently, re-run this script.")
+
+    # Reclaim space and refresh planner statistics (can't run inside a transaction)
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE filings"))
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    asyncio.run(compact())
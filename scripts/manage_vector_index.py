@@ -0,0 +1,35 @@
+import asyncio
+import argparse
+from app.services.vector_index import (
+    ANN_INDEXES, VECTOR_INDEX_TYPE, index_status, ensure_vector_index, rebuild_vector_index
+)
+
+
+async def run(command: str, names: list[str], index_type: str):
+    for name in names:
+        if command == "build":
+            await ensure_vector_index(name, index_type)
+        elif command == "rebuild":
+            await rebuild_vector_index(name, index_type)
+
+        status = await index_status(name)
+        if not status:
+            print(f"Index {name} does not exist.\n")
+            continue
+        print(f"Index:      {name}")
+        print(f"Valid:      {status['is_valid']}")
+        print(f"Size:       {status['size']}")
+        print(f"Definition: {status['definition']}\n")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Manage the ANN index on filings.embedding.")
+    parser.add_argument("command", choices=["status", "build", "rebuild"])
+    parser.add_argument("--index", choices=list(ANN_INDEXES), help="Only act on this index (default: all)")
+    parser.add_argument("--type", default=VECTOR_INDEX_TYPE, choices=["hnsw", "ivfflat"], help="Index type for build/rebuild")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.command, [args.index] if args.index else list(ANN_INDEXES), args.type))
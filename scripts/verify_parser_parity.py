@@ -0,0 +1,81 @@
+import argparse
+import difflib
+import glob
+import os
+import tempfile
+from app.services.sec_service import clean_text
+from app.services.html_text import TEXT_BACKENDS, PARITY_BACKENDS
+
+DEFAULT_GLOB = os.path.join("sec_downloads", "sec-edgar-filings", "*", "10-K", "*", "*.txt")
+
+# Malformed markup of the kind EDGAR filings are full of; checked on every run
+MALFORMED_SAMPLES = {
+    "unbalanced": "<p>one<p>two<td>three</table>four<b>five</i>six</b>",
+    "stray_end_tags": "<div>a</span>b</div></div>c<br/>d</p>e",
+    "text_outside_html": "lead text<html><body><p>body</p></body></html>trailing",
+    "rcdata_children": "<html><head><title>a<b>c</b></title></head><body><textarea>x<i>y</i></textarea>z</body></html>",
+    "unclosed_table": "<table><tr><td>Revenue<td>$ 383,285<tr><td>Net income</td><td>96,995</table>tail",
+}
+
+
+def verify(paths: list[str], reference: str = "bs4", backends: list[str] | None = None,
+           strict: bool = True) -> bool:
+    """
+    Checks that each parser backend extracts exactly the same text as the reference backend.
+    With strict=False differences are only reported (DIFF) and never fail the check.
+    """
+    ok = True
+    for path in paths:
+        expected = clean_text(path, backend=reference)
+        for backend in backends or PARITY_BACKENDS:
+            if backend == reference:
+                continue
+            got = clean_text(path, backend=backend)
+            if got == expected:
+                print(f"PASS {backend:<7} {path} ({len(got)} chars)")
+                continue
+            ok = ok and not strict
+            print(f"{'FAIL' if strict else 'DIFF'} {backend:<7} {path}: {len(got)} chars vs {len(expected)} from {reference}")
+            diff = difflib.unified_diff(expected.splitlines(), got.splitlines(), reference, backend, lineterm="", n=1)
+            for line in list(diff)[:20]:
+                print(f"    {line}")
+    return ok
+
+
+def verify_malformed(reference: str = "bs4", backends: list[str] | None = None, strict: bool = True) -> bool:
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for name, html in MALFORMED_SAMPLES.items():
+            path = os.path.join(directory, f"{name}.htm")
+            with open(path, "w") as f:
+                f.write(html)
+            paths.append(path)
+        return verify(paths, reference, backends, strict)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Verify that the HTML-to-text backends that claim parity produce identical output."
+    )
+    parser.add_argument("paths", nargs="*", help=f"Filing files (default: {DEFAULT_GLOB})")
+    parser.add_argument("--reference", default="bs4", choices=list(TEXT_BACKENDS))
+    parser.add_argument("--backends",
+                        help=f"Comma-separated backends that must match (default: {','.join(PARITY_BACKENDS)})")
+    parser.add_argument("--compare-others", action="store_true",
+                        help="Also report differences of the remaining backends (e.g. lxml); informational only")
+    args = parser.parse_args()
+    backends = args.backends.split(",") if args.backends else list(PARITY_BACKENDS)
+    others = [b for b in TEXT_BACKENDS if b not in backends] if args.compare_others else []
+
+    paths = args.paths or sorted(glob.glob(DEFAULT_GLOB))
+    ok = verify_malformed(args.reference, backends)
+    if paths:
+        ok = verify(paths, args.reference, backends) and ok
+    if others:
+        verify_malformed(args.reference, others, strict=False)
+        if paths:
+            verify(paths, args.reference, others, strict=False)
+    if not paths:
+        print("No filings found; checked the built-in malformed samples only "
+              "(download some first, e.g. scripts/verify_sec_download.py, or pass paths).")
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,95 @@
+import os
+import time
+import asyncio
+import argparse
+from app.database import AsyncSessionLocal, init_db
+from app.services.corpus_snapshot import (
+    EMBEDDING_DTYPES, SnapshotError, export_filing, import_filing, list_filings, read_manifest, write_manifest,
+)
+from bulk_ingest import parse_tickers, parse_years
+
+async def export_snapshot(directory: str, tickers: list[str], years: list[int], dtype: str, concurrency: int):
+    os.makedirs(directory, exist_ok=True)
+    async with AsyncSessionLocal() as db:
+        filings = await list_filings(db, tickers, years)
+    print(f"Exporting {len(filings)} filings to {directory} ({dtype} vectors)...")
+
+    started = time.monotonic()
+    entries = []
+    limit = asyncio.Semaphore(concurrency)
+
+    async def export_one(ticker: str, year: int):
+        async with limit, AsyncSessionLocal() as db:
+            entry = await export_filing(db, directory, ticker, year, dtype)
+        if entry is not None:
+            entries.append(entry)
+            print(f"  {ticker} {year}: {entry['rows']} chunks")
+
+    await asyncio.gather(*(export_one(ticker, year) for ticker, year in filings))
+    write_manifest(directory, entries)
+    size = sum(os.path.getsize(os.path.join(directory, e["file"])) for e in entries)
+    print(f"Exported {len(entries)} filings, {sum(e['rows'] for e in entries)} chunks, "
+          f"{size / 1e6:.1f} MB in {time.monotonic() - started:.0f}s.")
+
+async def import_snapshot(directory: str, tickers: list[str], years: list[int], concurrency: int):
+    manifest = read_manifest(directory)
+    entries = [
+        e for e in manifest["filings"]
+        if (not tickers or e["ticker"] in tickers) and (not years or e["year"] in years)
+    ]
+    await init_db()
+    print(f"Importing {len(entries)} filings from {directory} (snapshot of {manifest['created_at']})...")
+
+    started = time.monotonic()
+    failed = []
+    written = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def import_one(entry: dict):
+        nonlocal written
+        # A session (and transaction) per filing: a bad file never leaves a half-loaded filing
+        async with limit, AsyncSessionLocal() as db:
+            try:
+                new_rows = await import_filing(db, directory, entry)
+            except SnapshotError as e:
+                failed.append(entry)
+                print(f"  {entry['ticker']} {entry['year']}: REJECTED ({e})")
+                return
+        written += new_rows
+        print(f"  {entry['ticker']} {entry['year']}: {new_rows} new of {entry['rows']} chunks")
+
+    await asyncio.gather(*(import_one(entry) for entry in entries))
+    print(f"Imported {len(entries) - len(failed)}/{len(entries)} filings, {written} new chunks "
+          f"in {time.monotonic() - started:.0f}s.")
+    if failed:
+        raise SystemExit(f"{len(failed)} filings failed integrity checks: "
+                         + ", ".join(f"{e['ticker']} {e['year']}" for e in failed))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export the indexed corpus (chunks + embeddings) to a snapshot directory, or import one. "
+                    "Import makes no embedding API calls."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("export", "import"):
+        command = commands.add_parser(name)
+        command.add_argument("directory", help="Snapshot directory")
+        command.add_argument("--tickers", help="Comma-separated tickers to include (default: all)")
+        command.add_argument("--tickers-file", action="append", default=[], help="File with tickers to include")
+        command.add_argument("--years", help="Years or ranges to include, e.g. 2019-2023 (default: all)")
+        command.add_argument("--concurrency", type=int, default=4, help="Filings processed in parallel (default: 4)")
+    commands.choices["export"].add_argument("--dtype", choices=sorted(EMBEDDING_DTYPES), default="float16",
+                                            help="Stored embedding precision (default: float16)")
+
+    args = parser.parse_args()
+
+    tickers = parse_tickers(args.tickers, args.tickers_file)
+    years = parse_years(args.years) if args.years else []
+    concurrency = max(1, args.concurrency)
+    if args.command == "export":
+        asyncio.run(export_snapshot(args.directory, tickers, years, args.dtype, concurrency))
+    else:
+        try:
+            asyncio.run(import_snapshot(args.directory, tickers, years, concurrency))
+        except SnapshotError as e:
+            raise SystemExit(str(e))